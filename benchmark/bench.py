@@ -0,0 +1,220 @@
+"""
+benchmark of every plotter across data sizes, output formats and dpi
+
+    python -m benchmark.bench                              # full matrix, print the table
+    python -m benchmark.bench --quick --save base.json     # small matrix, store the results as baseline
+    python -m benchmark.bench --baseline base.json --max-slowdown 0.25 --max-memory 0.25
+
+each case runs in a fresh process, so that peak memory of one case is not hidden by an earlier one,
+the time is the median of --repeat renders, the peak RSS is sampled with psutil while the case runs
+the exit status is 1 when a case is slower or uses more memory than the baseline by more than the thresholds
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+import psutil
+from tabulate import tabulate
+
+FORMATS = ("png", "pdf", "svg")
+
+
+class Case(NamedTuple):
+    plotter: str
+    size: str
+    fmt: str
+    dpi: int
+    params: tuple
+
+    @property
+    def name(self) -> str:
+        return "{}[{}]-{}-{}dpi".format(self.plotter, self.size, self.fmt, self.dpi)
+
+
+def _plot_plt(fname, n):
+    from hplot import plot_plt
+
+    x = np.linspace(0, 10, n)
+    plot_plt([dict(x=x, y=np.sin(x)), dict(x=x, y=np.cos(x))], fname, xlabel="x", ylabel="y", legend=["a", "b"])
+
+
+def _plot_sns(fname, runs, n):
+    from hplot import plot_sns
+
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 10, n)
+    ys = [np.sin(x) + 0.3 * rng.standard_normal(n) for _ in range(runs)]
+    plot_sns([dict(x=[x] * runs, y=ys, label="a")], fname, xlabel="x", ylabel="y", errorbar="sd")
+
+
+def _plot_box(fname, groups, n, engine):
+    from hplot import plot_box
+
+    rng = np.random.default_rng(0)
+    data = [dict(label=str(i), y=rng.standard_normal(n) + i) for i in range(groups)]
+    plot_box(data, fname, engine=engine)
+
+
+def _plot_heatmap(fname, n):
+    from hplot import plot_heatmap
+
+    x = np.linspace(-10, 10, n)
+    z = x[None, :] ** 2 + x[:, None] ** 2
+    plot_heatmap(x, x, z, fname, vmin=0, vmax=200, levels=[10], level_colors=["red"], backend="image")
+
+
+_RUNNERS = dict(plot_plt=_plot_plt, plot_sns=_plot_sns, plot_box=_plot_box, plot_heatmap=_plot_heatmap)
+
+
+def cases(quick: bool = False) -> List[Case]:
+    """
+    the benchmark matrix, sizes are series length, runs x length, groups x samples or grid size
+    """
+    if quick:
+        sizes = dict(
+            plot_plt=[("1e4", (10**4,))],
+            plot_sns=[("5x1e3", (5, 10**3))],
+            plot_box=[("4x1e4-exact", (4, 10**4, "exact"))],
+            plot_heatmap=[("200", (200,))],
+        )
+        formats, dpis = ("png", "pdf"), (150,)
+    else:
+        sizes = dict(
+            plot_plt=[("1e3", (10**3,)), ("1e5", (10**5,)), ("1e6", (10**6,))],
+            plot_sns=[("3x1e3", (3, 10**3)), ("10x1e4", (10, 10**4)), ("10x1e5", (10, 10**5))],
+            plot_box=[
+                ("4x1e4-seaborn", (4, 10**4, "seaborn")),
+                ("4x1e6-exact", (4, 10**6, "exact")),
+                ("4x1e6-sketch", (4, 10**6, "sketch")),
+            ],
+            plot_heatmap=[("100", (100,)), ("1000", (1000,)), ("4000", (4000,))],
+        )
+        formats, dpis = FORMATS, (150, 600)
+    return [
+        Case(plotter, size, fmt, dpi, params)
+        for plotter, options in sizes.items()
+        for (size, params), fmt, dpi in itertools.product(options, formats, dpis)
+    ]
+
+
+def _run_case(case: Case, repeat: int) -> Dict:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from hplot.config import hConfig
+
+    hConfig.dpi = case.dpi
+    process = psutil.Process()
+    peak = [process.memory_info().rss]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.005):
+            peak[0] = max(peak[0], process.memory_info().rss)
+
+    times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, "figure." + case.fmt)
+        # the first render also imports the plotting modules, it is not timed
+        _RUNNERS[case.plotter](fname, *case.params)
+        start_rss = process.memory_info().rss
+        peak[0] = start_rss
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            _RUNNERS[case.plotter](fname, *case.params)
+            times.append(time.perf_counter() - start)
+        done.set()
+        sampler.join()
+        size = os.path.getsize(fname)
+    peak[0] = max(peak[0], process.memory_info().rss)
+    return dict(time=statistics.median(times), peak_rss=peak[0], rss_increase=peak[0] - start_rss, bytes=size)
+
+
+def run(selected: List[Case], repeat: int = 3) -> Dict[str, Dict]:
+    results = dict()
+    for case in selected:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            results[case.name] = executor.submit(_run_case, case, repeat).result()
+        print(".", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, max_slowdown: float, max_memory: float):
+    """
+    :return: (table rows, names of regressed cases)
+    """
+    rows, regressed = [], []
+    for name, r in results.items():
+        b = baseline.get(name, None)
+        row = [name, "{:.3f}".format(r["time"]), "{:.1f}".format(r["peak_rss"] / 2**20)]
+        if b is None:
+            rows.append(row + ["", "", "", "", "new"])
+            continue
+        time_ratio = r["time"] / b["time"]
+        rss_ratio = r["peak_rss"] / b["peak_rss"]
+        status = []
+        if time_ratio > 1.0 + max_slowdown:
+            status.append("slower")
+        if rss_ratio > 1.0 + max_memory:
+            status.append("memory")
+        if status:
+            regressed.append(name)
+        rows.append(
+            row
+            + [
+                "{:.3f}".format(b["time"]),
+                "{:.2f}x".format(time_ratio),
+                "{:.1f}".format(b["peak_rss"] / 2**20),
+                "{:.2f}x".format(rss_ratio),
+                ", ".join(status) or "ok",
+            ]
+        )
+    return rows, regressed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="small matrix, for a smoke run")
+    parser.add_argument("-k", "--filter", default=None, help="only cases whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=3, help="renders per case, the median is reported")
+    parser.add_argument("--baseline", default=None, help="json of a previous run to compare against")
+    parser.add_argument("--save", default=None, help="write the results to this json")
+    parser.add_argument("--max-slowdown", type=float, default=0.25, help="allowed relative slowdown, 0.25 = 25%%")
+    parser.add_argument("--max-memory", type=float, default=0.25, help="allowed relative peak RSS increase")
+    args = parser.parse_args(argv)
+
+    selected = [c for c in cases(args.quick) if args.filter is None or args.filter in c.name]
+    results = run(selected, args.repeat)
+
+    baseline = dict()
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    rows, regressed = compare(results, baseline, args.max_slowdown, args.max_memory)
+    headers = ["case", "time [s]", "peak RSS [MiB]", "base time", "ratio", "base RSS", "ratio", "status"]
+    print(tabulate(rows, headers=headers))
+
+    if args.save is not None:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if regressed:
+        print("\n{} regression(s): {}".format(len(regressed), ", ".join(regressed)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
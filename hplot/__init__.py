@@ -1,6 +1,45 @@
-from hplot.plot_plt import plot_plt
-from hplot.plot_sns import plot_sns
-from hplot.plot_box import plot_box
-from hplot.plot_heatmap import plot_heatmap
-from hplot.plot_legend import plot_legend
-from hplot.plot_2y import plot_2y
+import importlib
+import sys
+import types
+
+# plotters are imported on first attribute access, so that `import hplot` does not
+# load matplotlib, seaborn and pandas before they are needed
+_LAZY_ATTRS = {
+    "plot_plt": "hplot.plot_plt",
+    "plot_sns": "hplot.plot_sns",
+    "plot_box": "hplot.plot_box",
+    "plot_heatmap": "hplot.plot_heatmap",
+    "plot_legend": "hplot.plot_legend",
+    "plot_2y": "hplot.plot_2y",
+    "plot_grid": "hplot.plot_grid",
+    "render_many": "hplot.batch",
+    "RenderCache": "hplot.cache",
+    "ProfileSummary": "hplot.profile",
+    "use_config": "hplot.config",
+    "ConfigSnapshot": "hplot.config",
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+class _LazyModule(types.ModuleType):
+    def __getattr__(self, name):
+        module = _LAZY_ATTRS.get(name)
+        if module is None:
+            raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+        value = getattr(importlib.import_module(module), name)
+        self.__dict__[name] = value
+        return value
+
+    def __setattr__(self, name, value):
+        # the import system binds submodules on the package, e.g. hplot.plot_plt,
+        # which would shadow the plotter of the same name
+        if name in _LAZY_ATTRS and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+    def __dir__(self):
+        return sorted(set(super().__dir__()) | set(_LAZY_ATTRS))
+
+
+sys.modules[__name__].__class__ = _LazyModule
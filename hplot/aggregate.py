@@ -0,0 +1,156 @@
+import os
+import warnings
+from statistics import NormalDist
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+ErrorBar = Union[None, str, Tuple[str, float]]
+
+_DEFAULT_LEVEL = {"sd": 1.0, "se": 1.0, "pi": 95.0, "ci": 95.0}
+
+# bytes of working memory used by aggregate_runs_chunked
+DEFAULT_MEMORY_BUDGET = 256 << 20
+
+
+def parse_errorbar(errorbar: ErrorBar) -> Tuple[Optional[str], Optional[float]]:
+    """
+    parse a seaborn style errorbar spec
+    :param errorbar: None, "sd", "se", "pi", "ci" or a tuple (method, level)
+        "sd": estimator +- level * standard deviation
+        "se": estimator +- level * standard error
+        "pi": percentile interval of width level
+        "ci": normal approximation confidence interval of width level
+    :return: (method, level)
+    """
+    if errorbar is None:
+        return None, None
+    if isinstance(errorbar, str):
+        method, level = errorbar, None
+    else:
+        method, level = errorbar
+    assert method in _DEFAULT_LEVEL, "errorbar must be one of {}".format(list(_DEFAULT_LEVEL))
+    if level is None:
+        level = _DEFAULT_LEVEL[method]
+    return method, float(level)
+
+
+def aggregate_runs(
+    y: np.ndarray,
+    estimator: str = "mean",
+    errorbar: ErrorBar = ("sd", 1),
+) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    aggregate repeated runs in one vectorized pass
+    :param y: np.ndarray, shape of y is [runs, points]
+    :param estimator: "mean" or "median"
+    :param errorbar: see parse_errorbar
+    :return: (center, low, high), each shape is [points,], low and high are None without errorbar,
+        a point without values has a nan center, a point with a single value of several runs has a nan
+        sd / se / ci band, as in seaborn, so that no band is drawn there
+    """
+    y = np.asarray(y, dtype=float)
+    if y.ndim == 1:
+        y = y[None, :]
+    assert y.ndim == 2, "y must be [runs, points]"
+    assert estimator in ("mean", "median"), "estimator must be 'mean' or 'median'"
+
+    method, level = parse_errorbar(errorbar)
+    # empty points and single values with ddof=1 are nan by definition, not worth a warning
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return _aggregate(y, estimator, method, level)
+
+
+def _aggregate(y: np.ndarray, estimator: str, method: Optional[str], level: Optional[float]):
+    center = np.nanmean(y, axis=0) if estimator == "mean" else np.nanmedian(y, axis=0)
+    if method is None:
+        return center, None, None
+
+    n = np.sum(~np.isnan(y), axis=0)
+    ddof = 1 if y.shape[0] > 1 else 0
+    if method == "pi":
+        half = (100.0 - level) / 2.0
+        low, high = np.nanpercentile(y, [half, 100.0 - half], axis=0)
+        return center, low, high
+
+    spread = np.nanstd(y, axis=0, ddof=ddof)
+    if method in ("se", "ci"):
+        spread = spread / np.sqrt(np.maximum(n, 1))
+    if method == "ci":
+        level = NormalDist().inv_cdf(0.5 + level / 200.0)
+    return center, center - level * spread, center + level * spread
+
+
+def load_array(a) -> np.ndarray:
+    """
+    open a .npy file as a read-only memmap, arrays and memmaps are returned without copy
+    """
+    if isinstance(a, (str, os.PathLike)):
+        return np.load(a, mmap_mode="r")
+    return np.asarray(a)
+
+
+def as_runs(y) -> Union[np.ndarray, List[np.ndarray]]:
+    """
+    :param y: path, 1-d array (one run), 2-d array [runs, points] or a list of paths / 1-d arrays
+    :return: sequence of 1-d runs, nothing is copied for memmapped inputs
+    """
+    if isinstance(y, (list, tuple)):
+        return [load_array(yi).reshape(-1) for yi in y]
+    y = load_array(y)
+    if y.ndim == 1:
+        return [y]
+    assert y.ndim == 2, "y must be [points,] or [runs, points]"
+    return y
+
+
+def aggregate_runs_chunked(
+    runs: Sequence[np.ndarray],
+    estimator: str = "mean",
+    errorbar: ErrorBar = ("sd", 1),
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    aggregate_runs over blocks of points, so that runs stored as memmaps are read
+    piecewise and the working memory stays below memory_budget
+    the returned curves themselves have one value per point
+    :param runs: sequence of 1-d arrays with the same length, or a 2-d array [runs, points]
+    :param estimator: "mean" or "median"
+    :param errorbar: see parse_errorbar
+    :param memory_budget: int, bytes
+    :return: (center, low, high)
+    """
+    n_runs = len(runs)
+    n = runs[0].shape[0]
+    for run in runs:
+        assert run.shape == (n,), "all runs must have the same length"
+    # the block plus temporaries of nan-aware reductions and percentiles
+    chunk = int(max(1, min(n, memory_budget // (n_runs * 8 * 4))))
+
+    center = np.empty(n)
+    low = high = None
+    if errorbar is not None:
+        low, high = np.empty(n), np.empty(n)
+    block = np.empty((n_runs, chunk))
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        b = block[:, : stop - start]
+        for r, run in enumerate(runs):
+            b[r] = run[start:stop]
+        c, lo, hi = aggregate_runs(b, estimator=estimator, errorbar=errorbar)
+        center[start:stop] = c
+        if low is not None:
+            low[start:stop], high[start:stop] = lo, hi
+    return center, low, high
+
+
+def same_x(x0: np.ndarray, x: np.ndarray, memory_budget: int = DEFAULT_MEMORY_BUDGET) -> bool:
+    """
+    compare two possibly memmapped 1-d arrays block by block
+    """
+    if x.shape != x0.shape:
+        return False
+    chunk = int(max(1, memory_budget // 16))
+    return all(np.array_equal(x0[i : i + chunk], x[i : i + chunk]) for i in range(0, x0.shape[0], chunk))
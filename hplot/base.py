@@ -1,46 +1,521 @@
+import io
 import os
+import threading
+import time
+import warnings
+from contextlib import contextmanager, nullcontext
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 
-import matplotlib.pyplot as plt
+from matplotlib import rc_context, rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
-from hplot.config import hConfig
+from hplot import fonts
+from hplot.config import current, hConfig, use_config
+from hplot.utils import cm2inch
 
 
 class Base(metaclass=ABCMeta):
+    # names of attributes / kwargs whose change requires redrawing the data artists,
+    # any other change passed to render only re-applies the decoration
+    _redraw_keys = ()
+    # attributes which are not inputs of the figure, see _cache_inputs
+    _cache_exclude = ("fig", "ax", "ax2", "lines", "fname", "display", "pad", "budget_actions")
+
     def __init__(self, **kwargs):
+        self._defer = kwargs.pop("defer", False)
+        # an axes of another figure to draw into, e.g. a panel of plot_grid
+        self._target_ax = kwargs.pop("ax", None)
         self._kwargs = kwargs
+        # the config the plotter is constructed with, every render of it uses this snapshot
+        self._config = current()
         self.fname = None
         self.fig = None
         self.ax = None
         self.pad = None
         self.display = None
+        self._pyplot_num = None
+        # per stage timings of the current render, only collected with kwargs["profile"], see hplot.profile
+        self._timer = None
+        self._created = None
+        # set while run() renders, run() reports the render together with the cache stage
+        self._running = False
+        if kwargs.get("profile", None) is not None:
+            self._created = (time.perf_counter(), time.process_time())
+        # what kwargs["render_budget"] changed in the last render
+        self.budget_actions = []
+
+    @classmethod
+    def build(cls, *args, **kwargs):
+        """
+        construct and preprocess without rendering, the returned plotter is rendered with render()
+        example: p = plot_plt.build(data); p.render("a.png"); p.render("b.png", xlim=[0, 1]); p.close()
+        """
+        return cls(*args, defer=True, **kwargs)
+
+    def _stage(self, stage: str):
+        return self._timer.stage(stage) if self._timer is not None else _NO_STAGE
+
+    def _start_profile(self):
+        """
+        a new timer for every render, the construction counts as the preprocess stage of the first one
+        """
+        if self._kwargs.get("profile", None) is None:
+            self._timer = None
+            return
+        from hplot.profile import StageTimer
+
+        self._timer = StageTimer()
+        if self._created is not None:
+            wall, cpu = self._created
+            self._timer.add("preprocess", time.perf_counter() - wall, time.process_time() - cpu)
+            self._created = None
+
+    def _preprocess(self):
+        pass
+
+    def _fig_size(self):
+        return hConfig.fig_size
+
+    def _new_figure(self):
+        if self._target_ax is not None:
+            self.fig = self._target_ax.figure
+            self.ax = self._target_ax
+            return
+        # figures are not registered in pyplot, so plotters can render concurrently in threads
+        self.fig = Figure(figsize=cm2inch(*self._fig_size()), dpi=self._figure_dpi())
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot()
+
+    def _render_budget(self):
+        from hplot.budget import resolve_budget
+
+        return resolve_budget(self._kwargs.get("render_budget", None))
+
+    def _figure_dpi(self):
+        """
+        hConfig.dpi, lowered until the raster buffer fits into kwargs["render_budget"]
+        """
+        budget = self._render_budget()
+        if budget is None:
+            return hConfig.dpi
+        from hplot.budget import fit_dpi, raster_bytes
+
+        size = cm2inch(*self._fig_size())
+        dpi = fit_dpi(size, hConfig.dpi, budget)
+        if dpi < hConfig.dpi:
+            self.budget_actions.append(
+                "dpi {} -> {}, the {:.0f} MiB raster exceeds the budget".format(
+                    hConfig.dpi, dpi, raster_bytes(size, hConfig.dpi) / 2**20
+                )
+            )
+        return dpi
+
+    def _downsample_points(self):
+        """
+        kwargs["downsample_points"], default the points needed at the width and dpi of the figure
+        """
+        n_out = self._kwargs.get("downsample_points", None)
+        if n_out is None:
+            from hplot.downsample import target_points
+
+            n_out = target_points(self._kwargs.get("downsample", None) or "lttb", fig=self.fig)
+        return n_out
+
+    def _fit_budget(self):
+        """
+        after drawing, reduce the path data of the figure to kwargs["render_budget"],
+        first by downsampling the series of plotters that support it, then by rasterizing
+        the heaviest artists of vector outputs
+        """
+        budget = self._render_budget()
+        if budget is None:
+            return
+        from hplot.budget import VECTOR_FORMATS, heavy_artists, vertex_bytes
+
+        artists = heavy_artists(self.fig)
+        vertices = sum(n for n, _ in artists)
+        if vertex_bytes(vertices) <= budget:
+            return
+        if "downsample" in self._redraw_keys and self._kwargs.get("downsample", None) is None:
+            # for this render only, _preprocess drops series cached by the plotter, such as the curves of plot_sns
+            self._kwargs["downsample"] = "minmax"
+            try:
+                self._preprocess()
+                self._redraw_artists()
+            finally:
+                del self._kwargs["downsample"]
+            artists = heavy_artists(self.fig)
+            self.budget_actions.append(
+                "downsampled {} vertices with minmax to {}".format(vertices, sum(n for n, _ in artists))
+            )
+            vertices = sum(n for n, _ in artists)
+            if vertex_bytes(vertices) <= budget:
+                return
+
+        formats = {os.path.splitext(p)[1][1:].lower() for p in self._output_paths()}
+        if formats & set(VECTOR_FORMATS):
+            rasterized = 0
+            for n, artist in artists:
+                if vertex_bytes(vertices) <= budget:
+                    break
+                if not artist.get_rasterized():
+                    artist.set_rasterized(True)
+                    vertices -= n
+                    rasterized += 1
+            if rasterized:
+                self.budget_actions.append("rasterized {} artists in vector outputs".format(rasterized))
 
     @abstractmethod
-    def plot(self):
+    def _draw(self):
+        """
+        draw the data artists on self.ax
+        """
         pass
 
+    def _decorate(self):
+        """
+        apply labels, ticks, limits and legend, must be safe to call again on the same axes
+        """
+        pass
+
+    def plot(self):
+        with self._stage("draw"):
+            self._new_figure()
+            self._draw()
+            self._fit_budget()
+        with self._stage("decorate"):
+            self._decorate()
+
+    def _redraw_artists(self):
+        # keep the figure, only replace its axes and artists
+        if self._target_ax is not None:
+            # the figure is shared, only this axes is cleared
+            self.ax.cla()
+        else:
+            self.fig.clf()
+            self.ax = self.fig.add_subplot()
+        self._draw()
+
+    def _redraw(self):
+        with self._stage("draw"):
+            self._redraw_artists()
+            self._fit_budget()
+        with self._stage("decorate"):
+            self._decorate()
+
+    @classmethod
+    def _style_rc(cls, kwargs: Dict) -> Dict:
+        """
+        rc parameters of the style a plotter draws with, e.g. a seaborn style
+        """
+        return dict()
+
+    def _rc_params(self) -> Dict:
+        """
+        rcParams of a render of this plotter, they are set only while it renders
+        """
+        rc = self._style_rc(self._kwargs)
+        rc["mathtext.fontset"] = "stix"
+        if hConfig.usetex:
+            from hplot.tex import RC
+
+            rc.update(RC)
+        # texts without their own font, such as tick labels, are created with the tick font
+        rc.update(fonts.rc())
+        return rc
+
+    @contextmanager
+    def _rendering(self):
+        """
+        activate the config snapshot and the rcParams of this plotter
+        """
+        with use_config(self._config), _RC_GATE.apply(self._rc_params()):
+            if hConfig.usetex:
+                from hplot.tex import cache_dir
+
+                # usetex renders hold the gate alone, no other render sees this directory
+                with cache_dir():
+                    yield
+            else:
+                yield
+
+    def render(self, fname=None, display=None, **changes):
+        """
+        render the figure, or re-render it after changing some options
+        :param fname: str, save here instead of the current fname
+        :param display: bool
+        :param changes: new values of constructor arguments, such as data, xlabel or kwargs like xlim
+        :return: self
+        """
+        if not self._running:
+            self._start_profile()
+        if fname is not None:
+            self.fname = fname
+        if display is not None:
+            self.display = display
+
+        redraw = False
+        for k, v in changes.items():
+            if k in vars(self) and not k.startswith("_"):
+                setattr(self, k, v)
+            else:
+                self._kwargs[k] = v
+            redraw = redraw or k in self._redraw_keys
+
+        with self._rendering():
+            self.budget_actions = []
+            if self.fig is None:
+                self.plot()
+            elif redraw:
+                with self._stage("preprocess"):
+                    self._preprocess()
+                self._redraw()
+            elif changes:
+                with self._stage("decorate"):
+                    self._decorate()
+
+            if self.budget_actions:
+                warnings.warn("{}: {}".format(type(self).__name__, "; ".join(self.budget_actions)), RuntimeWarning)
+
+            if hConfig.usetex:
+                from hplot.tex import fallback
+
+                fallback(self.fig)
+            if self.fname is not None:
+                self.save()
+            if self.display:
+                self.show()
+        if self._timer is not None and not self._running:
+            self._report()
+        return self
+
+    def _output_paths(self) -> List[str]:
+        """
+        fname may be one path or a list of paths, kwargs["formats"] (e.g. ["png", "pdf"]) writes
+        every path once per format with the extension replaced
+        """
+        if self.fname is None:
+            return []
+        fnames = [self.fname] if isinstance(self.fname, (str, os.PathLike)) else list(self.fname)
+        formats = self._kwargs.get("formats", None)
+        if formats is None:
+            return [os.fspath(f) for f in fnames]
+        paths = []
+        for f in fnames:
+            root = os.path.splitext(os.fspath(f))[0]
+            paths.extend(root + "." + fmt.lstrip(".") for fmt in formats)
+        return list(dict.fromkeys(paths))
+
+    def _tight_bbox(self):
+        # the same bbox as savefig(bbox_inches="tight"), computed once for all outputs
+        self.fig.draw_without_rendering()
+        renderer = self.fig.canvas.get_renderer()
+        return self.fig.get_tightbbox(renderer).padded(rcParams["savefig.pad_inches"])
+
     def save(self):
+        """
+        the layout and the tight bbox are computed once and every output is written from the same figure,
+        with kwargs["parallel_save"] the files are encoded one after another in memory and written to
+        disk by a thread pool
+        """
         # self.fig.set_tight_layout(True)
         # plt.tight_layout(pad=hConfig.pad)
-        if self.fname is None:
-            pass
-        else:
-            dir_path = os.path.dirname(self.fname)
-            os.makedirs(dir_path, exist_ok=True)
-            plt.savefig(self.fname, bbox_inches="tight")
+        paths = self._output_paths()
+        if not paths:
+            return
+        for dir_path in {os.path.dirname(p) for p in paths}:
+            if dir_path:
+                os.makedirs(dir_path, exist_ok=True)
+        with self._stage("layout"):
+            bbox = self._tight_bbox()
+
+        if not self._kwargs.get("parallel_save", False) or len(paths) == 1:
+            with self._stage("save"):
+                for path in paths:
+                    self.fig.savefig(path, bbox_inches=bbox)
+            return
+
+        buffers = []
+        with self._stage("save"):
+            for path in paths:
+                buf = io.BytesIO()
+                self.fig.savefig(buf, format=os.path.splitext(path)[1][1:], bbox_inches=bbox)
+                buffers.append(buf)
+
+        def write(path, buf):
+            with open(path, "wb") as f:
+                f.write(buf.getbuffer())
+
+        with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+            list(executor.map(write, paths, buffers))
+
+    def _attach_pyplot(self):
+        """
+        give the figure a pyplot window, only needed to display it
+        """
+        import matplotlib.pyplot as plt
+
+        if self._pyplot_num is None:
+            manager = plt.figure().canvas.manager
+            manager.canvas.figure = self.fig
+            self.fig.set_canvas(manager.canvas)
+            self._pyplot_num = manager.num
 
     def show(self):
         # self.fig.set_tight_layout(True)
         # plt.tight_layout(pad=hConfig.pad)
+        import matplotlib.pyplot as plt
+
+        self._attach_pyplot()
         plt.show()
 
+    def _cache_inputs(self):
+        inputs = {k: v for k, v in vars(self).items() if not k.startswith("_") and k not in self._cache_exclude}
+        inputs["kwargs"] = {k: v for k, v in self._kwargs.items() if k not in ("cache", "profile")}
+        return inputs
+
     def close(self):
-        plt.close()
+        if self._pyplot_num is not None:
+            import matplotlib.pyplot as plt
+
+            plt.close(self._pyplot_num)
+            self._pyplot_num = None
+        self.fig = None
+        self.ax = None
+
+    def _report(self, cached: bool = False):
+        """
+        deliver the timings of this render to kwargs["profile"], artists are counted before the figure is closed
+        """
+        from hplot.profile import RenderProfile, count_artists, deliver, output_bytes
+
+        artists, vertices = count_artists(self.fig) if self.fig is not None else (0, 0)
+        paths = self._output_paths()
+        profile = RenderProfile(
+            plotter=type(self).__name__,
+            paths=paths,
+            stages=dict(self._timer.stages),
+            artists=artists,
+            vertices=vertices,
+            bytes=output_bytes(paths),
+            cached=cached,
+            actions=tuple(self.budget_actions),
+        )
+        deliver(profile, self._kwargs["profile"])
 
     def run(self):
-        self.plot()
-        if self.fname is not None:
-            self.save()
-        if self.display:
-            self.show()
+        """
+        render, save and close, with kwargs["profile"] (a callable, a logging.Logger or a
+        hplot.profile.ProfileSummary) the wall / cpu time of the stages preprocess (construction),
+        draw, decorate, layout (tight bbox), save (encoding) and cache, the number of artists and
+        vertices and the output size are delivered as a hplot.profile.RenderProfile,
+        renders of a plotter from build() report every render()
+        """
+        self._start_profile()
+        self._running = True
+        try:
+            self._run()
+        finally:
+            self._running = False
+
+    def _run(self):
+        cache = self._kwargs.get("cache", None)
+        key = None
+        if cache is not None and self.fname is not None and not self.display:
+            from hplot.cache import RenderCache, UncacheableError
+
+            cache = RenderCache.get(cache)
+            with self._stage("cache"):
+                try:
+                    key = cache.key(self)
+                except UncacheableError as e:
+                    warnings.warn("the render is not cached, {}".format(e))
+                paths = self._output_paths()
+                hit = key is not None and cache.fetch(key, paths)
+            if hit:
+                if self._timer is not None:
+                    self._report(cached=True)
+                return
+            if key is not None:
+                cache.release(paths)
+        self.render()
+        if self._timer is not None:
+            self._report()
         self.close()
+        if key is not None:
+            with self._stage("cache"):
+                cache.store(key, paths)
+
+
+# returned by Base._stage when profiling is off
+_NO_STAGE = nullcontext()
+
+
+class _RcGate:
+    def __init__(self):
+        """
+        rcParams are global to the process, renders with equal rc parameters share them and run concurrently,
+        a render with other rc parameters waits until those finished,
+        usetex renders run alone, their tick labels are mathtext and the mathtext parser of matplotlib
+        is shared by all threads
+        """
+        self._cond = threading.Condition()
+        self._key = None
+        self._users = 0
+        self._saved = None
+        self._local = threading.local()
+
+    @contextmanager
+    def apply(self, rc: Dict):
+        if getattr(self._local, "inside", False):
+            # nested in a render of this thread, e.g. the save of plot_plt_stream
+            with rc_context(rc):
+                yield
+            return
+        if rc.get("text.usetex", False):
+            # equal to no other key
+            key = object()
+        else:
+            key = tuple(sorted((k, repr(v)) for k, v in rc.items()))
+        with self._cond:
+            while self._users and self._key != key:
+                self._cond.wait()
+            if not self._users:
+                # as rc_context does
+                self._saved = dict(rcParams.copy())
+                del self._saved["backend"]
+                try:
+                    rcParams.update(rc)
+                except Exception:
+                    dict.update(rcParams, self._saved)
+                    raise
+                self._key = key
+            self._users += 1
+        self._local.inside = True
+        try:
+            yield
+        finally:
+            self._local.inside = False
+            with self._cond:
+                self._users -= 1
+                if not self._users:
+                    dict.update(rcParams, self._saved)
+                    self._saved = None
+                    self._key = None
+                    self._cond.notify_all()
+
+
+_RC_GATE = _RcGate()
+
+
+def apply_rc(rc: Dict):
+    """
+    context in which rcParams are updated with rc, shared with the renders of the plotters,
+    waits until renders with other rc parameters finished, with text.usetex the context runs alone
+    example: with apply_rc(hplot.tex.RC): ...
+    :param rc: dict of rc parameters
+    """
+    return _RC_GATE.apply(rc)
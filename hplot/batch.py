@@ -0,0 +1,236 @@
+import gc
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context, shared_memory
+from typing import Dict, List, NamedTuple, Optional, Union
+
+import numpy as np
+from tqdm import tqdm
+
+from hplot import fonts
+from hplot.config import current, hConfig, set_defaults
+
+
+class RenderResult(NamedTuple):
+    index: int
+    ok: bool
+    error: Optional[str]
+    elapsed: float
+
+
+# blocks of earlier jobs that could not be closed yet, because arrays of them were still referenced
+_PENDING: List[shared_memory.SharedMemory] = []
+
+
+class _SharedArray(NamedTuple):
+    name: str
+    shape: tuple
+    dtype: str
+
+
+class _SharedBlocks:
+    """
+    shared memory blocks of the submitted jobs, one block per distinct array, an array passed to several jobs
+    is copied once and its block is unlinked when the last of these jobs completes
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        # id(array) -> [array, block, handle, number of jobs using it], the array is kept so its id is not reused
+        self._arrays: Dict[int, list] = {}
+
+    def share(self, obj, used: List[int]):
+        """
+        replace large arrays in obj by handles of shared memory blocks
+        :param used: the ids of the shared arrays are appended, pass them to release() when the job completes
+        """
+        if isinstance(obj, np.ndarray) and obj.dtype != object and obj.nbytes >= self.threshold:
+            entry = self._arrays.get(id(obj))
+            if entry is None:
+                shm = shared_memory.SharedMemory(create=True, size=obj.nbytes)
+                entry = self._arrays[id(obj)] = [obj, shm, _SharedArray(shm.name, obj.shape, obj.dtype.str), 0]
+                np.ndarray(obj.shape, dtype=obj.dtype, buffer=shm.buf)[...] = obj
+            entry[3] += 1
+            used.append(id(obj))
+            return entry[2]
+        if isinstance(obj, dict):
+            return {k: self.share(v, used) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)) and not isinstance(obj, _SharedArray):
+            return type(obj)(self.share(v, used) for v in obj)
+        return obj
+
+    def release(self, used: List[int]):
+        for key in used:
+            entry = self._arrays[key]
+            entry[3] -= 1
+            if entry[3] == 0:
+                del self._arrays[key]
+                _unlink(entry[1])
+
+    def close(self):
+        for entry in self._arrays.values():
+            _unlink(entry[1])
+        self._arrays.clear()
+
+
+def _unlink(shm: shared_memory.SharedMemory):
+    shm.close()
+    shm.unlink()
+
+
+def _attach(obj, blocks: List[shared_memory.SharedMemory]):
+    """
+    inverse of _SharedBlocks.share, executed in the worker process
+    """
+    if isinstance(obj, _SharedArray):
+        # workers of every start method share the resource tracker of the parent, which creates and unlinks
+        # the block, attaching registers the name a second time, unregistering here would drop the parent's entry
+        shm = shared_memory.SharedMemory(name=obj.name)
+        blocks.append(shm)
+        return np.ndarray(obj.shape, dtype=np.dtype(obj.dtype), buffer=shm.buf)
+    if isinstance(obj, dict):
+        return {k: _attach(v, blocks) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_attach(v, blocks) for v in obj)
+    return obj
+
+
+def resolve_plotter(plotter):
+    """
+    :param plotter: a hplot plotter class such as plot_sns, or its name "plot_sns"
+    :return: the plotter class
+    """
+    if isinstance(plotter, str):
+        import hplot
+
+        return getattr(hplot, plotter)
+    return plotter
+
+
+def parse_job(job: Union[Dict, tuple]):
+    """
+    :param job: dict(plotter=..., args=(...), kwargs={...}) or tuple (plotter, args, kwargs)
+    :return: (plotter, args, kwargs)
+    """
+    if isinstance(job, dict):
+        return job["plotter"], job.get("args", ()), job.get("kwargs", {})
+    return job[0], job[1] if len(job) > 1 else (), job[2] if len(job) > 2 else {}
+
+
+def _init_worker(config: Dict):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    # a forked worker inherits the use_config(...) of the thread that started it
+    set_defaults(config)
+    # the font list and the fonts of hConfig are loaded once per worker, not by its first job
+    fonts.prewarm()
+
+
+def _run_job(index: int, plotter, args, kwargs) -> RenderResult:
+    start = time.perf_counter()
+    blocks = []
+    try:
+        args = _attach(args, blocks)
+        kwargs = _attach(kwargs, blocks)
+        kwargs["display"] = False
+        resolve_plotter(plotter)(*args, **kwargs)
+        result = RenderResult(index, True, None, time.perf_counter() - start)
+    except Exception:
+        result = RenderResult(index, False, traceback.format_exc(), time.perf_counter() - start)
+    del args, kwargs
+    gc.collect()
+    _PENDING[:] = _close_blocks(_PENDING + blocks)
+    return result
+
+
+def _close_blocks(blocks: List[shared_memory.SharedMemory]) -> List[shared_memory.SharedMemory]:
+    """
+    :return: the blocks that are still referenced, e.g. by an artist, they are closed after a later job
+    """
+    pending = []
+    for shm in blocks:
+        try:
+            shm.close()
+        except BufferError:
+            pending.append(shm)
+    return pending
+
+
+def render_many(
+    jobs: List[Union[Dict, tuple]],
+    workers: Optional[int] = None,
+    *,
+    shm_threshold: int = 1 << 20,
+    progress: bool = True,
+    mp_context: Optional[str] = None,
+) -> List[RenderResult]:
+    """
+    render plot jobs in a process pool, with hConfig.usetex the labels, titles and legend entries of all jobs
+    are compiled in parallel into the shared tex cache (hConfig.tex_cache) before the jobs start
+    :param jobs: list of dict(plotter=..., args=(...), kwargs={...}) or tuple (plotter, args, kwargs)
+        plotter is a hplot plotter such as plot_sns or its name "plot_sns",
+        example: [dict(plotter="plot_plt", args=([dict(x=x, y=y)], "./figure/a.png"))]
+    :param workers: int, number of processes, default os.cpu_count()
+    :param shm_threshold: int, arrays with at least this many bytes are sent through shared memory
+    :param progress: bool, show a tqdm progress bar
+    :param mp_context: str, "fork", "spawn" or "forkserver", default is the platform default
+    :return: list[RenderResult], one per job in the order of jobs, a failed job does not stop the others
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    config = current().as_dict()
+    if hConfig.usetex:
+        from hplot.tex import job_texts, precompile
+
+        # the workers share the tex cache, every text is compiled once and in parallel
+        precompile(job_texts(jobs), workers=workers)
+
+    results = [None] * len(jobs)
+    blocks = _SharedBlocks(shm_threshold)
+    queue = iter(enumerate(jobs))
+    bar = tqdm(total=len(jobs), disable=not progress)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context(mp_context),
+            initializer=_init_worker,
+            initargs=(config,),
+        ) as executor:
+            # jobs are submitted as workers free up, only the arrays of the running jobs are in shared memory
+            running = {}
+            while True:
+                while len(running) < 2 * workers:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    i, job = item
+                    used = []
+                    try:
+                        plotter, args, kwargs = parse_job(job)
+                        args = blocks.share(tuple(args), used)
+                        kwargs = blocks.share(dict(kwargs), used)
+                        running[executor.submit(_run_job, i, plotter, args, kwargs)] = (i, used)
+                    except Exception:
+                        # a malformed job, or no shared memory left for its arrays
+                        blocks.release(used)
+                        results[i] = RenderResult(i, False, traceback.format_exc(), 0.0)
+                        bar.update()
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, used = running.pop(future)
+                    try:
+                        results[i] = future.result()
+                    except Exception:
+                        # the worker process died, e.g. killed by the OOM killer
+                        results[i] = RenderResult(i, False, traceback.format_exc(), 0.0)
+                    blocks.release(used)
+                    bar.update()
+    finally:
+        bar.close()
+        blocks.close()
+    return results
@@ -0,0 +1,63 @@
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+# outputs written as paths, their size grows with the number of vertices
+VECTOR_FORMATS = ("pdf", "svg", "svgz", "eps", "ps")
+
+# rgba buffer of the canvas plus the copy made while encoding
+_RASTER_BYTES_PER_PIXEL = 8
+# path data kept by the renderer or written to a vector file per vertex
+_BYTES_PER_VERTEX = 32
+# lowest dpi a budget may lower the figure to
+MIN_DPI = 72
+
+
+def resolve_budget(budget: Union[None, int, str]) -> Optional[int]:
+    """
+    :param budget: bytes, or "auto" for half of the memory available now, measured with psutil
+    """
+    if budget is None:
+        return None
+    if budget == "auto":
+        import psutil
+
+        return psutil.virtual_memory().available // 2
+    return int(budget)
+
+
+def raster_bytes(size: Tuple[float, float], dpi: float) -> int:
+    """
+    :param size: (width, height) in inch
+    """
+    return int(size[0] * dpi * size[1] * dpi * _RASTER_BYTES_PER_PIXEL)
+
+
+def fit_dpi(size: Tuple[float, float], dpi: float, budget: int) -> float:
+    """
+    the highest dpi, at most dpi, whose raster buffer fits into budget
+    """
+    need = raster_bytes(size, dpi)
+    if need <= budget:
+        return dpi
+    return max(MIN_DPI, int(dpi * np.sqrt(budget / need)))
+
+
+def vertex_bytes(vertices: int) -> int:
+    return vertices * _BYTES_PER_VERTEX
+
+
+def heavy_artists(fig) -> List[tuple]:
+    """
+    :return: list of (vertices, artist) of the data artists of fig, the heaviest first
+    """
+    from hplot.profile import artist_vertices
+
+    artists = []
+    for ax in fig.axes:
+        for a in ax.get_children():
+            n = artist_vertices(a)
+            if n:
+                artists.append((n, a))
+    artists.sort(key=lambda t: -t[0])
+    return artists
@@ -0,0 +1,229 @@
+import hashlib
+import inspect
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Union
+
+import numpy as np
+
+
+class UncacheableError(TypeError):
+    """
+    an input has no stable hash, e.g. an object whose repr holds its address, the render is not cached
+    """
+
+
+def _codes(code):
+    yield code
+    for c in code.co_consts:
+        if hasattr(c, "co_code"):
+            yield from _codes(c)
+
+
+def _update_function(h, f, seen):
+    """
+    a function is hashed by its code, its defaults, the contents of its closure and the globals it reads,
+    functions reached again through a closure or a global (recursion) are hashed by name
+    """
+    h.update(repr((f.__module__, f.__qualname__)).encode())
+    if f in seen:
+        h.update(b"|")
+        return
+    seen.add(f)
+    names = set()
+    for code in _codes(f.__code__):
+        h.update(code.co_code)
+        update_hash(h, [c for c in code.co_consts if not hasattr(c, "co_code")])
+        names.update(code.co_names)
+    update_hash(h, [f.__defaults__, f.__kwdefaults__])
+    for cell in f.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            # the variable is not assigned yet
+            value = None
+        _update_value(h, value, seen)
+    # co_names holds attribute names as well, only the ones bound in the module are globals
+    for name in sorted(names):
+        if name in f.__globals__:
+            update_hash(h, name)
+            _update_value(h, f.__globals__[name], seen)
+    h.update(b"|")
+
+
+def _update_value(h, value, seen):
+    if callable(value) and hasattr(value, "__code__"):
+        _update_function(h, value, seen)
+    elif inspect.ismodule(value):
+        update_hash(h, value.__name__)
+    else:
+        update_hash(h, value)
+
+
+def update_hash(h, obj):
+    """
+    feed obj into the hash h, arrays are hashed through their buffer without pickling,
+    the keys of RenderCache and of other caches of rendered output are built with it
+    :param h: hashlib object, e.g. hashlib.blake2b()
+    :param obj: arrays, sparse matrices, dicts, lists, tuples, .npy paths, functions, colormaps
+        and objects with an address-free repr
+    :raises UncacheableError: obj contains an object whose repr depends on its address
+    """
+    if isinstance(obj, np.ndarray):
+        h.update(b"ndarray")
+        h.update(obj.dtype.str.encode())
+        h.update(repr(obj.shape).encode())
+        if obj.dtype == object:
+            for v in obj.reshape(-1):
+                update_hash(h, v)
+        else:
+            h.update(memoryview(np.ascontiguousarray(obj)).cast("B"))
+    elif type(obj).__module__.startswith("scipy.sparse"):
+        csr = obj.tocsr(copy=True)
+        csr.sum_duplicates()
+        h.update(b"sparse")
+        update_hash(h, [csr.shape, csr.data, csr.indices, csr.indptr])
+    elif isinstance(obj, dict):
+        h.update(b"dict")
+        for k in sorted(obj, key=repr):
+            update_hash(h, k)
+            update_hash(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(type(obj).__name__.encode())
+        for v in obj:
+            update_hash(h, v)
+    elif isinstance(obj, (str, os.PathLike)) and str(obj).endswith(".npy") and os.path.isfile(obj):
+        # inputs given as .npy paths, the key changes when the file is rewritten
+        stat = os.stat(obj)
+        h.update(repr((os.fspath(obj), stat.st_size, stat.st_mtime_ns)).encode())
+    elif callable(obj) and hasattr(obj, "__code__"):
+        _update_function(h, obj, set())
+    elif type(obj).__module__ == "matplotlib.colors" and hasattr(obj, "N"):
+        # colormaps are hashed by their lookup table
+        update_hash(h, obj(np.linspace(0.0, 1.0, obj.N)))
+    else:
+        r = repr(obj)
+        if " at 0x" in r:
+            raise UncacheableError("cannot hash {}, its repr depends on its address".format(r))
+        h.update(r.encode())
+    h.update(b"|")
+
+
+class RenderCache:
+    def __init__(self, directory: str, max_bytes: int = 1 << 30, link: bool = False):
+        """
+        content addressed cache of rendered figures, opt in with the cache=RenderCache(...) or
+        cache="./path_to_cache" keyword of any plotter
+        :param directory: str, where the rendered files are kept
+        :param max_bytes: int, least recently used outputs are evicted above this size
+        :param link: bool, hard link cached files to fname instead of copying them
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def get(cls, cache: Union[str, "RenderCache"]) -> "RenderCache":
+        if isinstance(cache, RenderCache):
+            return cache
+        return cls(os.fspath(cache))
+
+    def key(self, plotter) -> str:
+        """
+        hash of the plotter class, its inputs, kwargs and its config snapshot
+        :raise UncacheableError: an input has no stable hash
+        """
+        import matplotlib
+
+        h = hashlib.blake2b(digest_size=20)
+        update_hash(h, type(plotter).__module__ + "." + type(plotter).__qualname__)
+        update_hash(h, plotter._cache_inputs())
+        update_hash(h, plotter._config.as_dict())
+        update_hash(h, matplotlib.__version__)
+        return h.hexdigest()
+
+    def _entry(self, key: str, path: str) -> str:
+        return os.path.join(self.directory, key + os.path.splitext(path)[1])
+
+    def fetch(self, key: str, paths: List[str]) -> bool:
+        """
+        deliver cached outputs to paths
+        :return: True on a hit, nothing is written on a miss
+        """
+        entries = [self._entry(key, p) for p in paths]
+        if not all(os.path.isfile(e) for e in entries):
+            self.misses += 1
+            return False
+        for entry, path in zip(entries, paths):
+            dir_path = os.path.dirname(path)
+            if dir_path:
+                os.makedirs(dir_path, exist_ok=True)
+            os.utime(entry)
+            self._deliver(entry, path)
+        self.hits += 1
+        return True
+
+    def _deliver(self, entry: str, path: str):
+        if os.path.lexists(path):
+            os.remove(path)
+        if self.link:
+            try:
+                os.link(entry, path)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(entry, path)
+
+    def release(self, paths: List[str]):
+        """
+        remove outputs before they are rendered again, so that writing them never
+        modifies a hard linked cache entry
+        """
+        if self.link:
+            for path in paths:
+                if os.path.lexists(path):
+                    os.remove(path)
+
+    def store(self, key: str, paths: List[str]):
+        os.makedirs(self.directory, exist_ok=True)
+        for path in paths:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            os.close(fd)
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, self._entry(key, path))
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for e in os.scandir(self.directory):
+            if e.is_file() and not e.name.endswith(".tmp"):
+                stat = e.stat()
+                entries.append((stat.st_mtime, stat.st_size, e.path))
+        return entries
+
+    def evict(self):
+        """
+        remove least recently used entries until the cache fits into max_bytes
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self) -> Dict:
+        entries = self._entries() if os.path.isdir(self.directory) else []
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            entries=len(entries),
+            bytes=sum(size for _, size, _ in entries),
+        )
@@ -1,3 +1,29 @@
+import contextvars
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Dict, Optional
+
+_KEYS = (
+    "fig_size",
+    "fig_size_for_double_y",
+    "dpi",
+    "pad",
+    "tick_size",
+    "base_font",
+    "base_font_weight",
+    "tick_label_font",
+    "legend_font",
+    "label_font",
+    "usetex",
+    "tex_cache",
+    "tex_fallback",
+    "title_font",
+)
+
+# ConfigSnapshot of the enclosing use_config(...), None outside of it
+_ACTIVE = contextvars.ContextVar("hplot_config", default=None)
+
+
 class Config:
     def __init__(self):
         self.reset()
@@ -29,21 +55,138 @@ class Config:
             "weight": self.base_font_weight,
         }
         self.usetex = False
+        # directory of the compiled texts of usetex mode, None for the matplotlib cache
+        self.tex_cache = None
+        # draw texts that do not need latex with mathtext in usetex mode
+        self.tex_fallback = True
 
     def keys(self):
-        return [
-            "fig_size",
-            "dpi",
-            "pad",
-            "tick_size",
-            "base_font",
-            "base_font_weight",
-            "tick_label_font",
-            "legend_font",
-            "label_font",
-            "usetex",
-            "title_font",
-        ]
+        return list(_KEYS)
+
+    def __getattribute__(self, name):
+        # inside use_config(...) the values of the active snapshot are read
+        if name in _KEYS:
+            snapshot = _ACTIVE.get()
+            if snapshot is not None:
+                return getattr(snapshot, name)
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        if name in _KEYS and _ACTIVE.get() is not None:
+            raise AttributeError("hConfig is read only inside hplot.use_config(), pass {}=".format(name))
+        object.__setattr__(self, name, value)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return {k: _thaw(v) for k, v in value.items()}
+    return value
+
+
+def _hashable(value):
+    if isinstance(value, MappingProxyType):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, tuple):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+class ConfigSnapshot:
+    __slots__ = ("_values", "_key")
+
+    def __init__(self, values: Dict):
+        """
+        immutable and hashable values of hConfig, font dicts are read only mappings and lists become tuples
+        :param values: dict with all keys of hConfig
+        """
+        if set(values) != set(_KEYS):
+            raise KeyError("a snapshot holds exactly the keys of hConfig, got {}".format(sorted(set(values) ^ set(_KEYS))))
+        frozen = {k: _freeze(values[k]) for k in _KEYS}
+        object.__setattr__(self, "_values", frozen)
+        object.__setattr__(self, "_key", tuple(_hashable(frozen[k]) for k in _KEYS))
+
+    def __getattr__(self, name):
+        try:
+            return object.__getattribute__(self, "_values")[name]
+        except KeyError:
+            raise AttributeError("ConfigSnapshot has no attribute {!r}".format(name)) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is immutable, use replace()")
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __eq__(self, other):
+        return isinstance(other, ConfigSnapshot) and self._key == other._key
+
+    def __repr__(self):
+        return "ConfigSnapshot({})".format(", ".join("{}={!r}".format(k, self.as_dict()[k]) for k in _KEYS))
+
+    def __reduce__(self):
+        return ConfigSnapshot, (self.as_dict(),)
+
+    def keys(self):
+        return list(_KEYS)
+
+    def replace(self, **changes) -> "ConfigSnapshot":
+        unknown = set(changes) - set(_KEYS)
+        if unknown:
+            raise KeyError("unknown config keys {}".format(sorted(unknown)))
+        return ConfigSnapshot(dict(self.as_dict(), **changes))
+
+    def as_dict(self) -> Dict:
+        """
+        plain, mutable copy of the values
+        """
+        return {k: _thaw(v) for k, v in self._values.items()}
 
 
 hConfig = Config()
+
+
+def current() -> ConfigSnapshot:
+    """
+    the snapshot of the enclosing use_config(...), or of the values of hConfig
+    """
+    snapshot = _ACTIVE.get()
+    if snapshot is not None:
+        return snapshot
+    return ConfigSnapshot({k: object.__getattribute__(hConfig, k) for k in _KEYS})
+
+
+def set_defaults(values: Dict):
+    """
+    set the values of hConfig and leave any use_config(...) inherited from the parent, for worker processes
+    """
+    _ACTIVE.set(None)
+    for k, v in values.items():
+        setattr(hConfig, k, v)
+
+
+@contextmanager
+def use_config(snapshot: Optional[ConfigSnapshot] = None, **changes):
+    """
+    use other config values in this context only, hConfig itself is not changed and other threads
+    (or asyncio tasks) keep their values, plotters constructed here keep the snapshot for all their renders
+    example: with hplot.use_config(dpi=300, usetex=True): plot_plt(data, "a.png")
+    :param snapshot: ConfigSnapshot to start from, default current()
+    :param changes: new values of hConfig keys
+    :return: the active ConfigSnapshot
+    """
+    active = snapshot if snapshot is not None else current()
+    if changes:
+        active = active.replace(**changes)
+    token = _ACTIVE.set(active)
+    try:
+        yield active
+    finally:
+        _ACTIVE.reset(token)
@@ -0,0 +1,118 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from hplot.config import hConfig
+from hplot.utils import cm2inch
+
+METHODS = ("lttb", "minmax")
+
+
+def target_points(method: str = "lttb", fig_size=None, dpi=None, fig=None) -> int:
+    """
+    number of points needed to draw a series across the figure width without visible loss
+    :param method: "lttb" or "minmax"
+    :param fig_size: (width, height) in centimeter, default hConfig.fig_size
+    :param dpi: default hConfig.dpi
+    :param fig: matplotlib Figure, its width and dpi are used instead of fig_size and dpi
+    :return: int
+    """
+    assert method in METHODS, "downsample must be one of {}".format(METHODS)
+    if fig is not None:
+        width = fig.get_size_inches()[0] * fig.dpi
+    else:
+        fig_size = hConfig.fig_size if fig_size is None else fig_size
+        dpi = hConfig.dpi if dpi is None else dpi
+        width = cm2inch(*fig_size)[0] * dpi
+    # lttb keeps one point per half column, minmax the minimum and the maximum of every pixel column
+    return 2 * int(np.ceil(width))
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, n_bins: int) -> np.ndarray:
+    """
+    indices of the minimum and maximum point of every pixel column and of the first and last point
+    :param x: np.ndarray, shape [n,], columns are split by value when x is sorted, by index otherwise
+    :param y: np.ndarray, shape [n,]
+    :param n_bins: int, number of pixel columns
+    :return: sorted indices into x and y
+    """
+    n = y.shape[0]
+    if np.all(x[1:] >= x[:-1]) and x[-1] > x[0]:
+        edges = np.linspace(x[0], x[-1], n_bins + 1)
+        starts = np.searchsorted(x, edges[:-1], side="left")
+    else:
+        starts = np.linspace(0, n, n_bins + 1).astype(np.int64)[:-1]
+    starts = np.unique(starts)
+    counts = np.diff(np.append(starts, n))
+    bin_id = np.repeat(np.arange(starts.shape[0]), counts)
+
+    mins = np.repeat(np.fmin.reduceat(y, starts), counts)
+    maxs = np.repeat(np.fmax.reduceat(y, starts), counts)
+    idx_min = np.flatnonzero(y == mins)
+    idx_max = np.flatnonzero(y == maxs)
+    # keep the first occurrence per column
+    _, first_min = np.unique(bin_id[idx_min], return_index=True)
+    _, first_max = np.unique(bin_id[idx_max], return_index=True)
+    return np.unique(np.concatenate([[0, n - 1], idx_min[first_min], idx_max[first_max]]))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    indices selected by largest triangle three buckets
+    the bucket averages are computed in one vectorized pass, the selection itself is
+    sequential over buckets since each bucket depends on the point picked before it
+    :param x: np.ndarray, shape [n,]
+    :param y: np.ndarray, shape [n,]
+    :param n_out: int, number of points kept, first and last point included
+    :return: sorted indices into x and y
+    """
+    n = y.shape[0]
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(np.append(edges, n))
+    avg_x = np.add.reduceat(x, edges) / counts
+    avg_y = np.add.reduceat(np.nan_to_num(y), edges) / counts
+    avg_x[-1], avg_y[-1] = x[-1], y[-1]
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        out[i + 1] = a
+    return out
+
+
+def downsample_indices(x, y, method: str = "lttb", n_out: Optional[int] = None) -> np.ndarray:
+    """
+    :param x: array, shape [n,]
+    :param y: array, shape [n,]
+    :param method: "lttb" or "minmax"
+    :param n_out: int, maximum number of points kept, default derived from hConfig.fig_size and hConfig.dpi
+    :return: sorted indices into x and y
+    """
+    assert method in METHODS, "downsample must be one of {}".format(METHODS)
+    x = np.asarray(x, dtype=float).reshape(-1)
+    y = np.asarray(y, dtype=float).reshape(-1)
+    assert x.shape == y.shape
+    if n_out is None:
+        n_out = target_points(method)
+    if x.shape[0] <= n_out:
+        return np.arange(x.shape[0])
+    if method == "lttb":
+        return lttb_indices(x, y, n_out)
+    # minmax keeps up to two points per column plus the first and the last point
+    return minmax_indices(x, y, max(1, (n_out - 2) // 2))
+
+
+def downsample(x, y, method: str = "lttb", n_out: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    downsample a series to the resolution of the output figure, peaks are kept
+    :return: (x, y)
+    """
+    idx = downsample_indices(x, y, method, n_out)
+    return np.asarray(x).reshape(-1)[idx], np.asarray(y).reshape(-1)[idx]
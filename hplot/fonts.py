@@ -0,0 +1,91 @@
+import warnings
+from functools import lru_cache
+from typing import Dict
+
+from matplotlib import font_manager
+from matplotlib.font_manager import FontProperties
+
+from hplot.config import hConfig
+
+GENERIC_FAMILIES = ("serif", "sans-serif", "cursive", "fantasy", "monospace")
+
+
+@lru_cache(maxsize=None)
+def resolve_family(family: str) -> str:
+    """
+    family, or the font matplotlib falls back to when family is not installed, looked up once
+    so that later lookups neither search nor warn again
+    """
+    if family in GENERIC_FAMILIES:
+        return family
+    if family in {f.name for f in font_manager.fontManager.ttflist}:
+        return family
+    fallback = font_manager.fontManager.defaultFamily["ttf"]
+    warnings.warn("font family {!r} not found, {!r} is used instead".format(family, fallback))
+    return fallback
+
+
+@lru_cache(maxsize=None)
+def _font(items: tuple) -> FontProperties:
+    spec = dict(items)
+    spec["family"] = resolve_family(spec["family"])
+    return FontProperties(**spec)
+
+
+def font(spec: Dict) -> FontProperties:
+    """
+    FontProperties of a font dict of hConfig, e.g. hConfig.label_font, one object per distinct dict,
+    all keys are passed to FontProperties with the family replaced by resolve_family,
+    the returned object is shared and must not be modified
+    """
+    return _font(tuple(sorted(spec.items())))
+
+
+def label_font() -> FontProperties:
+    return font(hConfig.label_font)
+
+
+def legend_font() -> FontProperties:
+    return font(hConfig.legend_font)
+
+
+def title_font() -> FontProperties:
+    return font(hConfig.title_font)
+
+
+def rc() -> Dict:
+    """
+    rc parameters a render runs with, texts without their own font, such as tick labels, use the tick font,
+    in usetex mode the font family is the one of hplot.tex.RC
+    """
+    if hConfig.usetex:
+        return {}
+    return {"font.family": [resolve_family(hConfig.tick_label_font)]}
+
+
+def style_ticks(*axes):
+    """
+    tick label size of axes, their font comes from rc() which is active while rendering
+    """
+    for ax in axes:
+        ax.tick_params(labelsize=hConfig.tick_size)
+
+
+def clear_cache():
+    """
+    forget resolved fonts, e.g. after installing a font with font_manager.fontManager.addfont
+    """
+    resolve_family.cache_clear()
+    _font.cache_clear()
+
+
+def prewarm():
+    """
+    load the font list of matplotlib and resolve the fonts of hConfig, e.g. at the start of a worker process,
+    so that the first render does not pay for it
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for fp in (label_font(), legend_font(), title_font()):
+            font_manager.findfont(fp)
+        font_manager.findfont(FontProperties(family=resolve_family(hConfig.tick_label_font), size=hConfig.tick_size))
@@ -0,0 +1,50 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+
+from hplot.aggregate import DEFAULT_MEMORY_BUDGET
+
+EXECUTORS = ("thread", "process")
+
+
+def _eval_rows(f: Callable, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    X, Y = np.meshgrid(x, y)
+    z = np.asarray(f(X, Y), dtype=float)
+    assert z.shape == X.shape, "f(X, Y) must return an array of the shape of X"
+    return z
+
+
+def evaluate_grid(
+    f: Callable,
+    x: np.ndarray,
+    y: np.ndarray,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    workers: Optional[int] = None,
+    executor: str = "thread",
+) -> np.ndarray:
+    """
+    evaluate a vectorized f(X, Y) on the grid spanned by x and y, a block of rows at a time,
+    so that the meshgrid and the intermediate arrays of f never exceed memory_budget
+    :param f: callable, f(X, Y) with X, Y of shape [rows, nx] returns an array of the same shape,
+        must be picklable, i.e. defined at module level, for executor="process"
+    :param x: array, shape [nx,]
+    :param y: array, shape [ny,]
+    :param memory_budget: int, bytes per block, about 4 arrays of the block are alive at once
+    :param workers: int, evaluate blocks concurrently, default None evaluates them in this thread
+    :param executor: "thread" or "process"
+    :return: array, shape [ny, nx]
+    """
+    assert executor in EXECUTORS, "executor must be one of {}".format(EXECUTORS)
+    x = np.asarray(x, dtype=float).reshape(-1)
+    y = np.asarray(y, dtype=float).reshape(-1)
+    rows = int(max(1, memory_budget // (x.shape[0] * 8 * 4)))
+    blocks = [y[start : start + rows] for start in range(0, y.shape[0], rows)]
+
+    if workers is None or workers <= 1 or len(blocks) == 1:
+        return np.concatenate([_eval_rows(f, x, block) for block in blocks], axis=0)
+
+    pool = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+    with pool(max_workers=min(workers, len(blocks))) as ex:
+        futures = [ex.submit(_eval_rows, f, x, block) for block in blocks]
+        return np.concatenate([fut.result() for fut in futures], axis=0)
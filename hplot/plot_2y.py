@@ -1,19 +1,16 @@
-import os
 from typing import Dict, List, Optional
-import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
-from matplotlib import rcParams
 from itertools import cycle
 import matplotlib.colors as mcolors
 
 from hplot.config import hConfig
-from hplot.utils import cm2inch
+from hplot.fonts import label_font, legend_font, style_ticks
 from hplot.base import Base
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 
 
 class plot_2y(Base):
+    _redraw_keys = ("data", "linewidths", "linestyles", "color_list", "style")
+
     def __init__(
         self,
         data: List[Dict],
@@ -39,6 +36,7 @@ class plot_2y(Base):
         :param fname: fname: str,
             the figure will be saved here,
             example: "./path_to_file/figure.png"
+            a list of paths, e.g. ["./figure.png", "./figure.pdf"], writes all of them from one render
         :param xlabel:  str
         :param ylabel:  str
         :param legend: list[str]
@@ -79,29 +77,20 @@ class plot_2y(Base):
         self.num_data = None
         self.fig = None
         self.ax = None
-        plt.cla()
-        plt.clf()
-        plt.close()
+        self.ax2 = None
 
-        self.__preprocess()
+        self._preprocess()
 
-        self.run()
+        if not self._defer:
+            self.run()
 
-    def __preprocess(self):
-        rcParams.update({"mathtext.fontset": "stix"})
+    def _preprocess(self):
         assert isinstance(self.data, (dict, list, tuple))
 
         if isinstance(self.data, dict):
             self.data = [self.data]
         self.num_data = len(self.data)
         assert self.num_data == 2, "only support 2 data"
-        # use tex to render fonts, tex install required
-        if hConfig.usetex:
-            from matplotlib import rc
-
-            rc("font", **{"family": "serif", "serif": ["Times New Roman"]})
-            rc("text", usetex=True)
-
         # color list
         cl = self._kwargs.get("color_list", None)
         if (cl is None) or len(cl) < self.num_data:
@@ -130,8 +119,18 @@ class plot_2y(Base):
         y = y.reshape(-1)
         return x, y, label
 
-    def plot(self):
-        self.fig, self.ax = plt.subplots(figsize=cm2inch(*hConfig.fig_size_for_double_y), dpi=hConfig.dpi)
+    @classmethod
+    def _style_rc(cls, kwargs: Dict) -> Dict:
+        import seaborn as sns
+
+        return dict(sns.axes_style(kwargs.get("style", "white")))
+
+    def _fig_size(self):
+        return hConfig.fig_size_for_double_y
+
+    def _draw(self):
+        import seaborn as sns
+
         # plot figure
         lws = self._kwargs.get("linewidths", None)
         if lws is not None:
@@ -145,64 +144,50 @@ class plot_2y(Base):
         assert cl is not None
 
         handles = []
-        style = self._kwargs.get("style", "white")
-        with sns.axes_style(style):
-            i = 0
-            d = self.data[i]
-            x, y, label = self._ppc_data(d)
-            lw = lws[i] if lws is not None else 2
-            ls = lss[i] if lss is not None else "-"
-            color = cl[i]
-            l1 = sns.lineplot(
-                x=x,
-                y=y,
-                label=label,
-                c=color,
-                linewidth=lw,
-                ls=ls,
-                ax=self.ax,
-                legend=False,
-            )
-            handles.append(l1)
-        with sns.axes_style(
-            "white",
-            {
-                "axes.edgecolor": "white",
-                "axes.spines.left": False,
-                "axes.spines.bottom": False,
-                "axes.spines.right": False,
-                "axes.spines.top": False,
-            },
-        ):
-            i = 1
-            d = self.data[i]
-            x, y, label = self._ppc_data(d)
-            lw = lws[i] if lws is not None else 2
-            ls = lss[i] if lss is not None else "-"
-            color = cl[i]
-            ax2 = self.ax.twinx()
-            sns.lineplot(
-                x=x,
-                y=y,
-                label=label,
-                c=color,
-                linewidth=lw,
-                ls=ls,
-                legend=False,
-                ax=ax2,
-            )
-
+        i = 0
+        d = self.data[i]
+        x, y, label = self._ppc_data(d)
+        lw = lws[i] if lws is not None else 2
+        ls = lss[i] if lss is not None else "-"
+        color = cl[i]
+        l1 = sns.lineplot(
+            x=x,
+            y=y,
+            label=label,
+            c=color,
+            linewidth=lw,
+            ls=ls,
+            ax=self.ax,
+            legend=False,
+        )
+        handles.append(l1)
+
+        i = 1
+        d = self.data[i]
+        x, y, label = self._ppc_data(d)
+        lw = lws[i] if lws is not None else 2
+        ls = lss[i] if lss is not None else "-"
+        color = cl[i]
+        ax2 = self.ax2 = self.ax.twinx()
+        # the second axes draws neither spines nor a grid over the first one
+        ax2.grid(False)
+        for spine in ax2.spines.values():
+            spine.set_visible(False)
+        sns.lineplot(
+            x=x,
+            y=y,
+            label=label,
+            c=color,
+            linewidth=lw,
+            ls=ls,
+            legend=False,
+            ax=ax2,
+        )
+
+    def _decorate(self):
+        ax2 = self.ax2
         # tick
-        # plt.tick_params(labelsize=hConfig.tick_size)
-        self.ax.tick_params(axis="x", labelsize=hConfig.tick_size)
-        self.ax.tick_params(axis="y", labelsize=hConfig.tick_size)
-        ax2.tick_params(axis="y", labelsize=hConfig.tick_size)
-        ax2.tick_params(axis="x", labelsize=hConfig.tick_size)
-
-        labels = self.ax.get_xticklabels() + self.ax.get_yticklabels()
-        [label.set_fontname(hConfig.tick_label_font) for label in labels]
-        labels = ax2.get_xticklabels() + ax2.get_yticklabels()
-        [label.set_fontname(hConfig.tick_label_font) for label in labels]
+        style_ticks(self.ax, ax2)
 
         # set legend
         legend_handles, legend_labels = self.ax.get_legend_handles_labels()
@@ -216,7 +201,7 @@ class plot_2y(Base):
         legend_loc = self._kwargs.get("legend_loc", "best")
         legend_dict["loc"] = "best" if legend_loc is None else legend_loc
         legend_dict["frameon"] = self._kwargs.get("legend_frameon", True)
-        legend_dict["prop"] = hConfig.legend_font
+        legend_dict["prop"] = legend_font()
 
         ncol = self._kwargs.get("legend_ncol", 1)
         if ncol is not None:
@@ -225,22 +210,22 @@ class plot_2y(Base):
         if self._kwargs.get("show_legend", True):
             self.ax.legend(**legend_dict)
         else:
-            plt.legend([], [], frameon=False)
+            ax2.legend([], [], frameon=False)
 
         #  label
         if self.xlabel is not None:
-            self.ax.set_xlabel(self.xlabel, hConfig.label_font)
+            self.ax.set_xlabel(self.xlabel, fontproperties=label_font())
         if self.xlabel is not None:
-            self.ax.set_ylabel(self.ylabel, hConfig.label_font)
+            self.ax.set_ylabel(self.ylabel, fontproperties=label_font())
         if self.y2label is not None:
-            ax2.set_ylabel(self.y2label, hConfig.label_font)
+            ax2.set_ylabel(self.y2label, fontproperties=label_font())
 
         xlim = self._kwargs.get("xlim", None)
         if xlim is not None:
-            plt.xlim(xlim)
+            ax2.set_xlim(xlim)
         ylim = self._kwargs.get("ylim", None)
         if ylim is not None:
-            plt.ylim(ylim)
+            ax2.set_ylim(ylim)
 
         xticks = self._kwargs.get("xticks", None)
         yticks = self._kwargs.get("yticks", None)
@@ -248,15 +233,15 @@ class plot_2y(Base):
         ytick_labels = self._kwargs.get("ytick_labels", None)
 
         if xticks is not None and xtick_labels is not None:
-            plt.xticks(xticks, xtick_labels)
+            ax2.set_xticks(xticks, xtick_labels)
         if yticks is not None and ytick_labels is not None:
-            plt.yticks(yticks, ytick_labels)
+            ax2.set_yticks(yticks, ytick_labels)
 
         ticklabel_style = self._kwargs.get("ticklabel_style", None)
         ticklabel_style_axis = self._kwargs.get("ticklabel_style_axis", "x")
         if ticklabel_style:
-            plt.ticklabel_format(style=ticklabel_style, axis=ticklabel_style_axis, scilimits=(0, 0))
+            ax2.ticklabel_format(style=ticklabel_style, axis=ticklabel_style_axis, scilimits=(0, 0))
 
         log_yaxis = self._kwargs.get("log_yaxis", None)
         if log_yaxis is not None:
-            plt.yscale("log")
+            ax2.set_yscale("log")
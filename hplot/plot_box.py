@@ -1,21 +1,19 @@
-import os
-from typing import Dict, List, Optional
+import colorsys
+from typing import Dict, List, Optional, Union
 import matplotlib.colors as mcolors
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-import seaborn as sns
-from matplotlib import rcParams
 
-from hplot.config import hConfig
-from hplot.utils import cm2inch
+from hplot.fonts import label_font, style_ticks
 from hplot.base import Base
+from hplot.quantile import ENGINES, box_stats, grouped_box_stats, resolve_engine, split_groups
 
 
 class plot_box(Base):
+    _redraw_keys = ("data", "width", "linewidth", "engine", "whis", "sketch_k")
+
     def __init__(
         self,
-        data: List[Dict],
+        data: Union[List[Dict], Dict],
         fname: Optional[str] = None,
         *,
         xlabel: Optional[str] = None,
@@ -26,8 +24,12 @@ class plot_box(Base):
         **kwargs
     ):
         """
-        :params data (list of dict): each dict with keys "label" and "y"
-        :params fname (str, optional): figure save path. Defaults to None.
+        :params data (list of dict): each dict with keys "label" and "y", or "label" and "chunks"
+            "y" may be an array, a memmap or a .npy path, "chunks" an iterable of arrays read once,
+            groups may have different lengths
+            or long form, a dict with keys "values" (array [n,]), "groups" (int array [n,], group index
+            of each value) and optionally "labels" (one label per group)
+        :params fname (str or list of str, optional): figure save path(s), all written from one render. Defaults to None.
         :param xlabel: str
         :param ylabel: str
         :params width (float, optional): width of each box. Defaults to 0.5.
@@ -35,6 +37,14 @@ class plot_box(Base):
         :params theme (str, optional): theme of seaborn. Defaults to None. darkgrid, whitegrid, dark, white, ticks
         :param kwargs["style"]: str
         "white", "dark", "whitegrid", "darkgrid"
+        :param kwargs["engine"]: str
+            "seaborn": sns.boxplot on a DataFrame of all samples, default
+            "exact": box statistics of all samples in one vectorized pass over the groups
+            "sketch": statistics from a streaming quantile sketch, memory independent of the number of samples
+            "auto": exact for array or memmap groups up to hplot.quantile.EXACT_THRESHOLD samples, sketch otherwise
+            boxes of the other engines than "seaborn" are drawn as a few collections for all groups
+        :param kwargs["whis"]: float, whisker length in units of the interquartile range, default 1.5
+        :param kwargs["sketch_k"]: int, size of the sketch, the rank error is about 1.7 / sketch_k, default 200
         """
         super().__init__(**kwargs)
         self.data = data
@@ -44,52 +54,171 @@ class plot_box(Base):
         self.width = width
         self.linewidth = linewidth
         self.display = display
+        self._stats = None
+        self._stats_data = None
 
         self.fig = None
         self.ax = None
-        plt.cla()
-        plt.clf()
-        plt.close()
-        self.ax = None
-        self.fig = None
-        style = kwargs.get("style", "white")
-        sns.set_style(style)
-        self.__preprocess()
-        self.run()
+        self._preprocess()
+        if not self._defer:
+            self.run()
 
-    def __preprocess(self):
-        rcParams.update({"mathtext.fontset": "stix"})
+    @classmethod
+    def _style_rc(cls, kwargs: Dict) -> Dict:
+        import seaborn as sns
+
+        return dict(sns.axes_style(kwargs.get("style", "white")))
+
+    def _preprocess(self):
         assert isinstance(self.data, (dict, list, tuple))
 
-        if isinstance(self.data, dict):
+        if isinstance(self.data, dict) and "values" not in self.data:
             self.data = [self.data]
-        self.num_data = len(self.data)
+        if self.data is not self._stats_data:
+            # new data, the statistics are kept across other redraws since streamed chunks are read once
+            self._stats = None
+            self._stats_data = self.data
+        self.num_data = len(self._groups()[0])
 
-        # use tex to render fonts, tex install required
-        if hConfig.usetex:
-            from matplotlib import rc
+    def _engine(self):
+        engine = self._kwargs.get("engine", "seaborn")
+        assert engine in ENGINES, "engine must be one of {}".format(ENGINES)
+        return engine
 
-            rc("font", **{"family": "serif", "serif": ["Times New Roman"]})
-            rc("text", usetex=True)
+    def _long_form(self):
+        return isinstance(self.data, dict)
 
-    def plot(self):
-        self.fig, self.ax = plt.subplots(figsize=cm2inch(*hConfig.fig_size), dpi=hConfig.dpi)
+    def _groups(self):
+        """
+        :return: (labels, groups), groups is the list of dicts with key "y" or "chunks",
+            or in long form the int n_groups, the number of groups of data["groups"]
+        """
+        if not self._long_form():
+            return [subdata["label"] for subdata in self.data], self.data
+        groups = np.asarray(self.data["groups"]).reshape(-1)
+        labels = self.data.get("labels", None)
+        n_groups = len(labels) if labels is not None else (int(groups.max()) + 1 if groups.shape[0] else 0)
+        labels = list(range(n_groups)) if labels is None else list(labels)
+        return labels, n_groups
+
+    def _draw(self):
+        if self._engine() != "seaborn":
+            self._draw_stats(self._box_stats())
+            return
+
+        import pandas as pd
+        import seaborn as sns
 
         data_dict = dict()
 
-        for subdata in self.data:
-            data_dict[subdata["label"]] = subdata["y"]
+        labels, groups = self._groups()
+        if self._long_form():
+            groups = [dict(y=y) for y in split_groups(self.data["values"], self.data["groups"], groups)]
+        for label, subdata in zip(labels, groups):
+            # series of different lengths are padded with nan, which sns.boxplot ignores
+            data_dict[label] = pd.Series(np.asarray(subdata["y"]))
 
         df = pd.DataFrame(data_dict)
-        sns.boxplot(data=df, width=self.width, linewidth=self.linewidth)
+        sns.boxplot(data=df, width=self.width, linewidth=self.linewidth, ax=self.ax)
+
+    def _box_stats(self):
+        # streamed chunks can only be read once, the statistics are kept until data or the engine changes,
+        # _preprocess drops them for new data
+        key = (self._engine(), self._kwargs.get("whis", 1.5), self._kwargs.get("sketch_k", 200))
+        if self._stats is None or self._stats[0] != key:
+            engine, whis, k = key
+            labels, groups = self._groups()
+            if self._long_form():
+                if engine == "sketch":
+                    groups = [dict(y=y) for y in split_groups(self.data["values"], self.data["groups"], groups)]
+                else:
+                    stats = grouped_box_stats(self.data["values"], self.data["groups"], groups, labels, whis)
+                    self._stats = (key, stats)
+                    return stats
+
+            stats = [None] * len(groups)
+            # all exact groups are computed in one grouped pass, the others are streamed into sketches
+            exact = []
+            for i, subdata in enumerate(groups):
+                y, chunks = subdata.get("y", None), subdata.get("chunks", None)
+                if resolve_engine(y, chunks, engine) == "exact" and chunks is None:
+                    exact.append(i)
+                else:
+                    stats[i] = box_stats(y=y, chunks=chunks, label=labels[i], engine=engine, whis=whis, k=k)
+            if exact:
+                ys = [np.asarray(groups[i]["y"], dtype=float).reshape(-1) for i in exact]
+                index = np.repeat(np.arange(len(exact)), [y.shape[0] for y in ys])
+                exact_stats = grouped_box_stats(np.concatenate(ys), index, len(exact), [labels[i] for i in exact], whis)
+                for i, st in zip(exact, exact_stats):
+                    stats[i] = st
+            self._stats = (key, stats)
+        return self._stats[1]
+
+    def _draw_stats(self, stats):
+        """
+        draw precomputed statistics in the style of sns.boxplot, the boxes of all groups are one
+        PolyCollection, whiskers, caps and medians one LineCollection and the fliers one Line2D
+        """
+        import seaborn as sns
+        from matplotlib.collections import LineCollection, PolyCollection
+
+        n = len(stats)
+        colors = [sns.desaturate(c, 0.75) for c in sns.color_palette(n_colors=n)]
+        # sns.boxplot draws the lines in a gray as dark as the darkest box
+        gray = mcolors.rgb2hex([min(colorsys.rgb_to_hls(*c)[1] for c in colors) * 0.6] * 3)
+
+        def field(name):
+            return np.array([st[name] for st in stats], dtype=float)
+
+        pos = np.arange(n, dtype=float)
+        q1, med, q3, whislo, whishi = field("q1"), field("med"), field("q3"), field("whislo"), field("whishi")
+        left, right = pos - self.width / 2, pos + self.width / 2
+        cap_l, cap_r = pos - self.width / 4, pos + self.width / 4
+
+        boxes = np.stack(
+            [np.stack([left, q1], 1), np.stack([right, q1], 1), np.stack([right, q3], 1), np.stack([left, q3], 1)], 1
+        )
+        self.ax.add_collection(
+            PolyCollection(boxes, facecolors=colors, edgecolors=gray, linewidths=self.linewidth, zorder=2)
+        )
+
+        def segments(x0, y0, x1, y1):
+            return np.stack([np.stack([x0, y0], 1), np.stack([x1, y1], 1)], 1)
+
+        lines = np.concatenate(
+            [
+                segments(pos, q1, pos, whislo),
+                segments(pos, q3, pos, whishi),
+                segments(cap_l, whislo, cap_r, whislo),
+                segments(cap_l, whishi, cap_r, whishi),
+                segments(left, med, right, med),
+            ]
+        )
+        self.ax.add_collection(LineCollection(lines, colors=gray, linewidths=self.linewidth, zorder=2))
+
+        counts = [len(st["fliers"]) for st in stats]
+        fliers = np.concatenate([np.asarray(st["fliers"], dtype=float) for st in stats]) if n else np.empty(0)
+        self.ax.plot(
+            np.repeat(pos, counts),
+            fliers,
+            linestyle="none",
+            marker="d",
+            markerfacecolor=gray,
+            markeredgecolor=gray,
+            markersize=5,
+        )
+
+        self.ax.update_datalim(np.stack([np.concatenate([left, right]), np.concatenate([whislo, whishi])], 1))
+        self.ax.autoscale_view()
+        self.ax.set_xticks(pos, [str(st["label"]) for st in stats])
+        self.ax.set_xlim(-0.5, n - 0.5)
 
+    def _decorate(self):
         # tick
-        plt.tick_params(labelsize=hConfig.tick_size)
-        labels = self.ax.get_xticklabels() + self.ax.get_yticklabels()
-        [label.set_fontname(hConfig.tick_label_font) for label in labels]
+        style_ticks(self.ax)
 
         # label
         if self.xlabel is not None:
-            plt.xlabel(self.xlabel, fontdict=hConfig.label_font)
+            self.ax.set_xlabel(self.xlabel, fontproperties=label_font())
         if self.ylabel is not None:
-            plt.ylabel(self.ylabel, fontdict=hConfig.label_font)
+            self.ax.set_ylabel(self.ylabel, fontproperties=label_font())
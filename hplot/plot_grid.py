@@ -0,0 +1,173 @@
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from hplot.base import Base
+from hplot.batch import resolve_plotter, parse_job
+from hplot.config import hConfig
+from hplot.fonts import legend_font, title_font
+from hplot.utils import cm2inch
+
+
+class plot_grid(Base):
+    _redraw_keys = ("panels", "ncols", "sharex", "sharey", "colorbar", "wspace", "hspace", "panel_size")
+    _cache_exclude = Base._cache_exclude + ("axes",)
+
+    def __init__(
+        self,
+        panels: List[Union[Dict, tuple]],
+        fname: Optional[str] = None,
+        *,
+        ncols: Optional[int] = None,
+        sharex: bool = False,
+        sharey: bool = False,
+        titles: Optional[List[str]] = None,
+        legend: bool = False,
+        colorbar: bool = False,
+        display: bool = False,
+        **kwargs
+    ):
+        """
+        draw many plots as panels of one figure, every panel plotter draws into its own axes
+        and the figure is laid out and saved once
+        :param panels: list of dict(plotter=..., args=(...), kwargs={...}) or tuple (plotter, args, kwargs),
+            as the jobs of render_many, plotter is a hplot plotter such as plot_sns or its name "plot_sns",
+            the fname of a panel must be None,
+            example: [dict(plotter="plot_sns", args=(data, None), kwargs=dict(xlabel="step"))]
+        :param fname: str or List[str]
+        :param ncols: int, panels per row, default ceil(sqrt(len(panels)))
+        :param sharex: bool, share the x axis of all panels, inner tick labels are hidden
+        :param sharey: bool, share the y axis of all panels
+        :param titles: List[str], one title per panel
+        :param legend: bool, replace the legends of the panels by one legend above the grid,
+            entries with the same label are shown once
+        :param colorbar: bool, replace the colorbars of plot_heatmap panels by one colorbar for the grid,
+            the panels should share vmin, vmax and cmap
+        :param display: bool
+        :param kwargs["panel_size"]: (width, height) in cm, default hConfig.fig_size
+        :param kwargs["wspace"]: float, horizontal space between panels, fraction of the panel width, default 0.3
+        :param kwargs["hspace"]: float, vertical space between panels, fraction of the panel height, default 0.4
+        :param kwargs["legend_ncol"]: int, columns of the shared legend, default all entries in one row
+        """
+        super().__init__(**kwargs)
+        self.panels = panels
+        self.fname = fname
+        self.ncols = ncols
+        self.sharex = sharex
+        self.sharey = sharey
+        self.titles = titles
+        self.legend = legend
+        self.colorbar = colorbar
+        self.display = display
+        self.fig = None
+        self.ax = None
+        self.axes = None
+        self._plotters = []
+        self._preprocess()
+        if not self._defer:
+            self.run()
+
+    def _preprocess(self):
+        assert len(self.panels) > 0, "no panels"
+        if self.titles is not None:
+            assert len(self.titles) == len(self.panels), "one title per panel"
+        self._ncols = self.ncols or int(np.ceil(np.sqrt(len(self.panels))))
+        self._nrows = int(np.ceil(len(self.panels) / self._ncols))
+
+    def _rc_params(self):
+        # the styles of the panels, such as the seaborn style of plot_sns, apply to the whole grid
+        rc = dict()
+        for panel in self.panels:
+            plotter, _, kwargs = parse_job(panel)
+            rc.update(resolve_plotter(plotter)._style_rc(kwargs))
+        rc.update(super()._rc_params())
+        return rc
+
+    def _fig_size(self):
+        w, h = self._kwargs.get("panel_size", hConfig.fig_size)
+        return w * self._ncols, h * self._nrows
+
+    def _new_figure(self):
+        self.fig = Figure(figsize=cm2inch(*self._fig_size()), dpi=self._figure_dpi())
+        FigureCanvasAgg(self.fig)
+        self._new_axes()
+
+    def _redraw_artists(self):
+        self.fig.clf()
+        self.fig.set_size_inches(cm2inch(*self._fig_size()))
+        self._new_axes()
+        self._draw()
+
+    def _new_axes(self):
+        self.axes = self.fig.subplots(
+            self._nrows,
+            self._ncols,
+            sharex=self.sharex,
+            sharey=self.sharey,
+            squeeze=False,
+            gridspec_kw=dict(wspace=self._kwargs.get("wspace", 0.3), hspace=self._kwargs.get("hspace", 0.4)),
+        )
+        self.ax = self.axes[0, 0]
+        for ax in self.axes.flat[len(self.panels) :]:
+            ax.set_visible(False)
+
+    def _draw(self):
+        self._plotters = []
+        for panel, ax in zip(self.panels, self.axes.flat):
+            plotter, args, kwargs = parse_job(panel)
+            kwargs = dict(kwargs, ax=ax)
+            if self.colorbar:
+                kwargs["colorbar"] = False
+            p = resolve_plotter(plotter).build(*args, **kwargs)
+            # the panels are decorated by _decorate of the grid
+            p._new_figure()
+            p._draw()
+            self._plotters.append(p)
+
+        if self.colorbar:
+            from hplot.plot_heatmap import style_colorbar
+
+            mappables = [p.mappable for p in self._plotters if getattr(p, "mappable", None) is not None]
+            if mappables:
+                style_colorbar(self.fig.colorbar(mappables[0], ax=self.axes.ravel().tolist()))
+
+    def _decorate(self):
+        for p in self._plotters:
+            p._decorate()
+
+        if self.titles is not None:
+            for title, ax in zip(self.titles, self.axes.flat):
+                ax.set_title(title, fontproperties=title_font())
+        if self.sharex or self.sharey:
+            for ax in self.axes.flat:
+                ax.label_outer()
+
+        for lgd in list(self.fig.legends):
+            lgd.remove()
+        if self.legend:
+            entries = dict()
+            for ax in self.axes.flat[: len(self.panels)]:
+                lgd = ax.get_legend()
+                if lgd is None:
+                    continue
+                for handle, text in zip(lgd.legend_handles, lgd.get_texts()):
+                    entries.setdefault(text.get_text(), handle)
+                lgd.remove()
+            if entries:
+                # just above the titles of the top row
+                offset = 4.0
+                if self.titles is not None:
+                    offset += rcParams["axes.titlepad"] + 1.2 * float(hConfig.title_font["size"])
+                top = self.fig.subplotpars.top + offset / 72.0 / self.fig.get_figheight()
+                self.fig.legend(
+                    list(entries.values()),
+                    list(entries.keys()),
+                    loc="lower center",
+                    bbox_to_anchor=(0.5, top),
+                    ncol=self._kwargs.get("legend_ncol", len(entries)),
+                    frameon=False,
+                    prop=legend_font(),
+                )
@@ -1,22 +1,42 @@
-from typing import List, Union, Optional
+from typing import Callable, List, Union, Optional
 
-import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
-from matplotlib import rcParams
+from matplotlib import colormaps
 
-from hplot.config import hConfig
-from hplot.utils import cm2inch
+from hplot.fonts import label_font, style_ticks
 from hplot.base import Base
-from matplotlib.colors import Colormap
+from hplot.aggregate import DEFAULT_MEMORY_BUDGET
+from hplot.grid import evaluate_grid
+from hplot.pyramid import decimate, is_sparse, output_shape, reduce_axis_values, reduce_factors
+from matplotlib.colors import Colormap, ListedColormap, Normalize, is_color_like, to_rgba
 
 
 class plot_heatmap(Base):
+    _redraw_keys = (
+        "x",
+        "y",
+        "z",
+        "cmap",
+        "vmin",
+        "vmax",
+        "center",
+        "levels",
+        "level_colors",
+        "lines",
+        "backend",
+        "reduce",
+        "reduce_shape",
+        "pyramid_dir",
+        "workers",
+        "executor",
+        "memory_budget",
+    )
+
     def __init__(
         self,
         x: Union[np.ndarray, List[float]],
         y: Union[np.ndarray, List[float]],
-        z: Union[np.ndarray, List[List[float]]],
+        z: Union[np.ndarray, List[List[float]], Callable],
         fname: str,
         *,
         cmap: Union[str, Colormap] = "BrBG",
@@ -33,8 +53,11 @@ class plot_heatmap(Base):
         """
         :param x: Union[np.ndarray, List[float]]
         :param y: Union[np.ndarray, List[float]]
-        :param z: Union[np.ndarray, List[List[float]]]
-        :param fname: str
+        :param z: Union[np.ndarray, List[List[float]], Callable]
+            a vectorized callable z(X, Y) is evaluated on the grid of x and y, at most at the
+            resolution of the drawn grid (see kwargs["reduce"]), the values are kept for re-renders,
+            a scipy.sparse matrix is reduced to the drawn grid from its nonzeros without densifying
+        :param fname: str or List[str], all paths are written from one render
         :param cmap: Union[str, Colormap]
         :param vmin: float
         :param vmax: float
@@ -46,6 +69,33 @@ class plot_heatmap(Base):
         :param display: bool
         :param kwargs["xtick_labels"]: List[str]
         :param kwargs["ytick_labels"]: List[str]
+        :param kwargs["backend"]: "seaborn" or "image"
+            "seaborn" draws one cell per value with sns.heatmap and uses the cell index as coordinate,
+            "image" draws z as a single rasterized imshow spanning the x / y values, or as a rasterized
+            pcolormesh with cells around each value when x or y is not evenly spaced,
+            tick labels, levels and lines are placed at the nearest x / y value
+        :param kwargs["lines"]: List[dict], keys x, y, c, width
+            points drawn over the heatmap, all lines are drawn as one collection,
+            width is a marker size for all points of the line or one size per point
+        :param kwargs["subcell"]: bool
+            place lines between grid points by linear interpolation instead of snapping them
+            to the nearest x / y value, only for monotonic x / y
+        :param kwargs["reduce"]: "mean", "max", "min" or None
+            when z has more cells than the figure has pixels, blocks of cells are reduced to one
+            before drawing and contouring, default "mean", None draws z unchanged,
+            sparse z is always reduced, with "mean" if None
+        :param kwargs["reduce_shape"]: (rows, columns)
+            maximal size of the drawn grid, default the figure size in pixels
+        :param kwargs["colorbar"]: bool
+            draw a colorbar, default True, the drawn image / mesh is kept in self.mappable
+        :param kwargs["pyramid_dir"]: str
+            keep 2x reduced levels of a memmapped z in this directory and reuse them in later renders
+        :param kwargs["workers"]: int
+            evaluate a callable z on blocks of rows concurrently, default in the calling thread
+        :param kwargs["executor"]: "thread" or "process"
+            pool used with workers, "process" requires a picklable z, default "thread"
+        :param kwargs["memory_budget"]: int
+            bytes per block of rows when evaluating a callable z
         """
         super().__init__(**kwargs)
         self.x = x
@@ -63,92 +113,266 @@ class plot_heatmap(Base):
         self.display = display
         self.fig = None
         self.ax = None
-        plt.cla()
-        plt.clf()
-        plt.close()
-        self.__preprocess()
-        self.run()
-
-    def __preprocess(self):
-        rcParams.update({"mathtext.fontset": "stix"})
+        self._grid = None
+        self._evaluated = None
+        self.mappable = None
+        self._preprocess()
+        if not self._defer:
+            self.run()
 
-        # use tex to render fonts, tex install required
-        if hConfig.usetex:
-            from matplotlib import rc
+    def _image_backend(self) -> bool:
+        backend = self._kwargs.get("backend", "seaborn")
+        assert backend in ("seaborn", "image"), "backend must be 'seaborn' or 'image'"
+        return backend == "image"
 
-            rc("font", **{"family": "serif", "serif": ["Times New Roman"]})
-            rc("text", usetex=True)
+    def _evaluate_grid(self, x, y):
+        """
+        evaluate a callable z at the block centers of the drawn grid instead of every x / y
+        """
+        if self._kwargs.get("reduce", "mean") is not None:
+            target = self._kwargs.get("reduce_shape", None) or output_shape(fig=self.fig)
+            fy, fx = reduce_factors((y.shape[0], x.shape[0]), target)
+            x, y = reduce_axis_values(x, fx), reduce_axis_values(y, fy)
 
-    def plot(self):
-        self.fig, self.ax = plt.subplots(
-            figsize=cm2inch(*hConfig.fig_size), dpi=hConfig.dpi
+        # re-renders with other colors, labels or levels reuse the values
+        if self._evaluated is not None:
+            f, ex, ey, z = self._evaluated
+            if f is self.z and np.array_equal(ex, x) and np.array_equal(ey, y):
+                return x, y, z
+        z = evaluate_grid(
+            self.z,
+            x,
+            y,
+            memory_budget=self._kwargs.get("memory_budget", DEFAULT_MEMORY_BUDGET),
+            workers=self._kwargs.get("workers", None),
+            executor=self._kwargs.get("executor", "thread"),
         )
+        self._evaluated = (self.z, x, y, z)
+        return x, y, z
+
+    def _reduce_grid(self):
+        x = np.asarray(self.x, dtype=float).reshape(-1)
+        y = np.asarray(self.y, dtype=float).reshape(-1)
+        if callable(self.z):
+            return self._evaluate_grid(x, y)
+        func = self._kwargs.get("reduce", "mean")
+        if is_sparse(self.z):
+            # aggregated without densifying, only a grid that already fits the output is made dense
+            z = self.z
+            func = func or "mean"
+        else:
+            z = self.z if isinstance(self.z, np.ndarray) else np.asarray(self.z)
+        if func is not None:
+            x, y, z = decimate(
+                x,
+                y,
+                z,
+                func,
+                target=self._kwargs.get("reduce_shape", None) or output_shape(fig=self.fig),
+                pyramid_dir=self._kwargs.get("pyramid_dir", None),
+            )
+        return x, y, np.asarray(z)
+
+    def _draw(self):
+        # the drawn grid, possibly reduced, all coordinates refer to it
+        self._grid = self._reduce_grid()
+        x, y, z = self._grid
+
         # plot figure
         if isinstance(self.cmap, str):
-            cmap = plt.get_cmap(self.cmap)
+            cmap = colormaps[self.cmap]
         else:
             cmap = self.cmap
 
-        self.ax = sns.heatmap(
-            self.z,
+        if self._image_backend():
+            self._draw_image(cmap)
+        else:
+            import seaborn as sns
+
+            self.ax = sns.heatmap(
+                z,
+                cmap=cmap,
+                vmin=self.vmin,
+                vmax=self.vmax,
+                center=self.center,
+                cbar=False,
+                ax=self.ax,
+            )
+            self.mappable = self.ax.collections[0]
+
+        if self._kwargs.get("colorbar", True):
+            cbar = self.fig.colorbar(self.mappable, ax=self.ax)
+            if not self._image_backend():
+                # as drawn by sns.heatmap
+                cbar.outline.set_linewidth(0)
+            style_colorbar(cbar)
+        if self.levels:
+            if self._image_backend():
+                self.ax.contour(x, y, z, colors=self.level_colors, levels=self.levels)
+            else:
+                self.ax.contour(z, colors=self.level_colors, levels=self.levels)
+
+        self._plot_all_lines(self._kwargs.get("lines", []))
+        if not self._image_backend():
+            self.ax.invert_yaxis()
+
+    def _draw_image(self, cmap):
+        x, y, z = self._grid
+        assert z.shape == (y.shape[0], x.shape[0]), "z must be [len(y), len(x)]"
+
+        if self.center is not None:
+            cmap = _center_cmap(cmap, self.vmin, self.vmax, self.center)
+        if not (_is_uniform(x) and _is_uniform(y)):
+            # an image has cells of one size, uneven cells are drawn as a mesh
+            self.mappable = self.ax.pcolormesh(
+                _cell_edges(x),
+                _cell_edges(y),
+                z,
+                cmap=cmap,
+                norm=Normalize(self.vmin, self.vmax),
+                rasterized=True,
+            )
+            return
+        self.mappable = self.ax.imshow(
+            z,
             cmap=cmap,
-            vmin=self.vmin,
-            vmax=self.vmax,
-            center=self.center,
+            norm=Normalize(self.vmin, self.vmax),
+            origin="lower",
+            extent=_edges(x) + _edges(y),
+            aspect="auto",
+            interpolation="nearest",
+            rasterized=True,
         )
 
-        cbar = self.ax.collections[0].colorbar
-        cbar.ax.tick_params(labelsize=hConfig.tick_size)
-        labels = cbar.ax.get_yticklabels()
-        [label.set_fontname(hConfig.tick_label_font) for label in labels]
-        if self.levels:
-            plt.contour(self.z, colors=self.level_colors, levels=self.levels)
+    def _axis_pos(self, tick, anchor, interpolate=False):
+        # sns.heatmap is drawn in cell indices, imshow in data coordinates
+        pos = self._tick2pos(tick, anchor, interpolate)
+        if self._image_backend():
+            anchor = np.asarray(anchor, dtype=float).reshape(-1)
+            return np.interp(pos, np.arange(anchor.shape[0]), anchor)
+        return pos
 
+    def _decorate(self):
         xtick_labels = self._kwargs.get("xtick_labels", None)
         ytick_labels = self._kwargs.get("ytick_labels", None)
         if xtick_labels is not None:
-            pos_list_x = self._tick2pos(xtick_labels, self.x)
-            plt.xticks(pos_list_x, xtick_labels, rotation=0)
+            pos_list_x = self._axis_pos(xtick_labels, self._grid[0])
+            self.ax.set_xticks(pos_list_x, xtick_labels, rotation=0)
         if ytick_labels is not None:
-            pos_list_y = self._tick2pos(ytick_labels, self.y)
-            plt.yticks(pos_list_y, ytick_labels)
-
-        lines = self._kwargs.get("lines", [])
-
-        for line in lines:
-            self._plot_lines(**line)
+            pos_list_y = self._axis_pos(ytick_labels, self._grid[1])
+            self.ax.set_yticks(pos_list_y, ytick_labels)
 
         if self.xlabel:
-            plt.xlabel(self.xlabel, hConfig.label_font)
+            self.ax.set_xlabel(self.xlabel, fontproperties=label_font())
         if self.ylabel:
-            plt.ylabel(self.ylabel, hConfig.label_font)
+            self.ax.set_ylabel(self.ylabel, fontproperties=label_font())
 
-        plt.tick_params(labelsize=hConfig.tick_size)
-        labels = self.ax.get_xticklabels() + self.ax.get_yticklabels()
-        [label.set_fontname(hConfig.tick_label_font) for label in labels]
-        self.ax.invert_yaxis()
+        style_ticks(self.ax)
 
     def _tick2pos(
         self,
         tick: Union[np.ndarray, List[float]],
         anchor: Union[np.ndarray, List[float]],
-    ) -> List[int]:
-        pos = []
+        interpolate: bool = False,
+    ) -> np.ndarray:
+        """
+        index of the anchor nearest to each tick, found by binary search on the sorted anchors
+        :param interpolate: bool, return fractional indices between neighbouring anchors,
+            falls back to the nearest anchor when anchor is not monotonic
+        """
+        tick = np.asarray(tick, dtype=float).reshape(-1)
+        anchor = np.asarray(anchor, dtype=float).reshape(-1)
+        n = anchor.shape[0]
+        if n == 1:
+            return np.zeros(tick.shape[0], dtype=np.int64)
+
+        diff = np.diff(anchor)
+        if np.all(diff >= 0):
+            order = np.arange(n)
+        else:
+            # unsorted or decreasing grid, a stable sort keeps the first of equal anchors
+            order = np.argsort(anchor, kind="stable")
+        sorted_anchor = anchor[order]
 
-        if isinstance(anchor, list):
-            anchor = np.array(anchor).reshape(-1)
+        if interpolate and (np.all(diff > 0) or np.all(diff < 0)):
+            return np.interp(tick, sorted_anchor, order.astype(float))
 
-        for t in tick:
-            t = float(t)
-            dist = (anchor - t) ** 2
-            label = np.argmin(dist)
-            pos.append(int(label))
-        return pos
+        right = np.searchsorted(sorted_anchor, tick, side="left").clip(1, n - 1)
+        left = right - 1
+        # first of equal anchors in the original order, so ties resolve like argmin
+        first_left = order[np.searchsorted(sorted_anchor, sorted_anchor[left], side="left")]
+        first_right = order[np.searchsorted(sorted_anchor, sorted_anchor[right], side="left")]
+        dist_left = tick - sorted_anchor[left]
+        dist_right = sorted_anchor[right] - tick
+        use_left = (dist_left < dist_right) | ((dist_left == dist_right) & (first_left <= first_right))
+        return np.where(use_left, first_left, first_right)
+
+    def _plot_all_lines(self, lines):
+        if not lines:
+            return
+        if not all(is_color_like(line["c"]) for line in lines):
+            # colormapped values, one collection per line
+            for line in lines:
+                self._plot_lines(**line)
+            return
+
+        interpolate = self._kwargs.get("subcell", False)
+        xs = [np.asarray(line["x"], dtype=float).reshape(-1) for line in lines]
+        ys = np.concatenate([np.asarray(line["y"], dtype=float).reshape(-1) for line in lines])
+        colors = np.repeat([to_rgba(line["c"]) for line in lines], [x.shape[0] for x in xs], axis=0)
+        # a width is one size for the line or one size per point
+        sizes = np.concatenate([np.broadcast_to(line["width"], x.shape) for line, x in zip(lines, xs)])
+        xs = np.concatenate(xs)
+        xt = self._axis_pos(xs, self._grid[0], interpolate)
+        yt = self._axis_pos(ys, self._grid[1], interpolate)
+        self.ax.scatter(xt, yt, c=colors, marker=".", s=sizes)
 
     def _plot_lines(self, x, y, c, width):
         # xtick_labels = self._kwargs.get("xtick_labels", None)
         # ytick_labels = self._kwargs.get("ytick_labels", None)
-        xt = self._tick2pos(x, self.x)
-        yt = self._tick2pos(y, self.y)
+        interpolate = self._kwargs.get("subcell", False)
+        xt = self._axis_pos(x, self._grid[0], interpolate)
+        yt = self._axis_pos(y, self._grid[1], interpolate)
         # print(xt, yt)
-        plt.scatter(xt, yt, c=c, marker=".", s=width)
+        self.ax.scatter(xt, yt, c=c, marker=".", s=width)
+
+
+def style_colorbar(cbar):
+    style_ticks(cbar.ax)
+
+
+def _edges(v: np.ndarray) -> tuple:
+    # outer edges of the first and last cell of an evenly spaced axis
+    half = (v[-1] - v[0]) / (2 * (v.shape[0] - 1)) if v.shape[0] > 1 else 0.5
+    return v[0] - half, v[-1] + half
+
+
+def _is_uniform(v: np.ndarray) -> bool:
+    if v.shape[0] < 3:
+        return True
+    step = np.diff(v)
+    return bool(np.allclose(step, step[0]))
+
+
+def _cell_edges(v: np.ndarray) -> np.ndarray:
+    # cell boundaries halfway between neighbouring values, the outer cells are as wide as their neighbour
+    if v.shape[0] == 1:
+        return np.array([v[0] - 0.5, v[0] + 0.5])
+    mid = (v[:-1] + v[1:]) / 2
+    return np.concatenate([[2 * v[0] - mid[0]], mid, [2 * v[-1] - mid[-1]]])
+
+
+def _center_cmap(cmap: Colormap, vmin: float, vmax: float, center: float) -> Colormap:
+    """
+    the colormap sns.heatmap uses for center, the middle of cmap is moved to center
+    """
+    vrange = max(vmax - center, center - vmin)
+    cmin, cmax = Normalize(center - vrange, center + vrange)([vmin, vmax])
+    centered = ListedColormap(cmap(np.linspace(cmin, cmax, 256)))
+    centered.set_bad(cmap(np.ma.masked_invalid([np.nan]))[0])
+    # out of range values keep the end colors unless cmap sets its own under / over colors
+    if cmap(-np.inf) != cmap(0):
+        centered.set_under(cmap(-np.inf))
+    if cmap(np.inf) != cmap(cmap.N - 1):
+        centered.set_over(cmap(np.inf))
+    return centered
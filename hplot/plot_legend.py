@@ -1,8 +1,41 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
 from typing import List, Optional, Tuple, Union
-import matplotlib.pyplot as plt
 from itertools import cycle
+import matplotlib
 import matplotlib.colors as mcolors
-from hplot.config import hConfig
+from matplotlib import rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from hplot.config import current
+from hplot.fonts import legend_font
+from hplot.cache import RenderCache, update_hash
+
+# rendered strips by key, most recently used last, plot_legend may run in several threads
+_STRIP_CACHE = OrderedDict()
+_STRIP_CACHE_SIZE = 256
+_STRIP_LOCK = threading.Lock()
+
+# rc parameters changed by the plotters which affect how the labels are rendered
+_TEXT_RC = ("text.usetex", "mathtext.fontset", "font.family", "font.serif", "font.sans-serif", "savefig.dpi")
+
+
+def clear_legend_cache():
+    with _STRIP_LOCK:
+        _STRIP_CACHE.clear()
+
+
+def _strip_key(*inputs) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    update_hash(h, inputs)
+    update_hash(h, current().as_dict())
+    update_hash(h, {k: rcParams[k] for k in _TEXT_RC})
+    update_hash(h, matplotlib.__version__)
+    return h.hexdigest()
 
 
 def plot_legend(
@@ -16,10 +49,23 @@ def plot_legend(
     figure_width: Optional[float] = 10,
     figure_height: Optional[float] = 0.32,
     display: Optional[bool] = False,
+    cache: Optional[Union[str, RenderCache]] = None,
 ):
-    plt.cla()
-    plt.clf()
-    plt.close()
+    """
+    draw a legend strip on its own, the strip is cropped to the legend
+    rendered strips are kept in memory keyed by the labels, styles, colors, widths, ncol, size, output format
+    and the font config, so that the same strip is written again without drawing
+    :param legends: List[str], labels
+    :param fname: str
+    :param linestyles: List[str]
+    :param linecolors: List[str], default tableau colors
+    :param linewidths: List[float], default 2
+    :param ncol: int
+    :param figure_width: float, inch
+    :param figure_height: float, inch
+    :param display: bool
+    :param cache: str or RenderCache, also keep the strips in this on-disk cache, shared between processes
+    """
     handles = []
     if linestyles is not None:
         assert len(legends) == len(linestyles)
@@ -32,29 +78,86 @@ def plot_legend(
     if linewidths is not None:
         assert len(legends) == len(linewidths)
 
+    fmt = None
+    if fname is not None:
+        fmt = os.path.splitext(os.fspath(fname))[1][1:].lower() or rcParams["savefig.format"]
+        key = _strip_key(
+            list(legends), linestyles, linecolors, linewidths, ncol, figure_width, figure_height, fmt
+        )
+        if not display and _fetch_strip(key, fname, cache):
+            return
+
     for i, ele in enumerate(legends):
         lw = linewidths[i] if linewidths is not None else 2
         ls = linestyles[i] if linestyles is not None else "-"
         lc = linecolors[i]
-        (line,) = plt.plot(range(10), label="line{}".format(i), lw=lw, ls=ls, color=lc)
-        handles.append(line)
-    fig, ax = plt.subplots(figsize=(figure_width, figure_height))
+        handles.append(Line2D([], [], label="line{}".format(i), lw=lw, ls=ls, color=lc))
+    fig = Figure(figsize=(figure_width, figure_height))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
     lgd = ax.legend(
         handles=handles,
         labels=legends,
         mode="expand",
         ncol=ncol,
         borderaxespad=0,
-        prop=hConfig.legend_font,
+        prop=legend_font(),
     )
     ax.axis("off")  # 去掉坐标的刻度
 
-    lgd_fig = lgd.figure
-    lgd_fig.canvas.draw()
-    bbox = lgd.get_window_extent().transformed(lgd_fig.dpi_scale_trans.inverted())
+    # the expanded legend is laid out in one draw pass which rasterizes nothing, then measured once
+    fig.draw_without_rendering()
+    bbox = lgd.get_window_extent(fig.canvas.get_renderer()).transformed(fig.dpi_scale_trans.inverted())
 
     if fname is not None:
-        lgd_fig.savefig(fname, bbox_inches=bbox, pad_inches=0)
+        buf = io.BytesIO()
+        fig.savefig(buf, format=fmt, bbox_inches=bbox, pad_inches=0)
+        _store_strip(key, fname, buf.getvalue(), cache)
     if display:
+        import matplotlib.pyplot as plt
+
+        manager = plt.figure().canvas.manager
+        manager.canvas.figure = fig
+        fig.set_canvas(manager.canvas)
         plt.show()
-    plt.close()
+        plt.close(manager.num)
+
+
+def _write(fname, data: bytes):
+    dir_path = os.path.dirname(os.fspath(fname))
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    with open(fname, "wb") as f:
+        f.write(data)
+
+
+def _fetch_strip(key: str, fname, cache) -> bool:
+    with _STRIP_LOCK:
+        data = _STRIP_CACHE.get(key, None)
+        if data is not None:
+            _STRIP_CACHE.move_to_end(key)
+    if data is not None:
+        _write(fname, data)
+        return True
+    if cache is not None and RenderCache.get(cache).fetch(key, [os.fspath(fname)]):
+        with open(fname, "rb") as f:
+            _remember(key, f.read())
+        return True
+    return False
+
+
+def _remember(key: str, data: bytes):
+    with _STRIP_LOCK:
+        _STRIP_CACHE[key] = data
+        _STRIP_CACHE.move_to_end(key)
+        while len(_STRIP_CACHE) > _STRIP_CACHE_SIZE:
+            _STRIP_CACHE.popitem(last=False)
+
+
+def _store_strip(key: str, fname, data: bytes, cache):
+    if cache is not None:
+        RenderCache.get(cache).release([os.fspath(fname)])
+    _write(fname, data)
+    _remember(key, data)
+    if cache is not None:
+        RenderCache.get(cache).store(key, [os.fspath(fname)])
@@ -1,16 +1,18 @@
 from itertools import cycle
-from typing import Dict, List, Optional
+from typing import Dict, Hashable, List, Optional
 
 import matplotlib.colors as mcolors
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
+import numpy as np
 
 from hplot.base import Base
-from hplot.config import hConfig
-from hplot.utils import cm2inch
+from hplot.fonts import label_font, legend_font, style_ticks
+from hplot.downsample import downsample
+from hplot.utils import GrowableBuffer
 
 
 class plot_plt(Base):
+    _redraw_keys = ("data", "color_list", "linewidths", "linestyles", "downsample", "downsample_points")
+
     def __init__(
         self,
         data: List[Dict],
@@ -29,6 +31,7 @@ class plot_plt(Base):
         :param fname:str,
             the figure will be saved here,
             example: "./path_to_file/figure.png"
+            a list of paths, e.g. ["./figure.png", "./figure.pdf"], writes all of them from one render
         :param xlabel: str
         :param ylabel: str
         :param legend: list[str]
@@ -47,6 +50,21 @@ class plot_plt(Base):
         :param kwargs["ytick_labels"]:
         :param kwargs["linewidths"]: List[str]
         :param kwargs["linestyles"]: List[str]
+        :param kwargs["downsample"]: "lttb" or "minmax"
+            reduce long series to the resolution of the figure before drawing
+        :param kwargs["downsample_points"]: int
+            maximum number of points per series, default derived from the width and dpi of the figure
+        :param kwargs["formats"]: List[str]
+            save fname once per format, e.g. ["png", "pdf", "svg"]
+        :param kwargs["parallel_save"]: bool
+            write the output files with a thread pool
+        :param kwargs["cache"]: RenderCache or str
+            skip rendering when the same inputs were rendered before, a str is the cache directory
+        :param kwargs["profile"]: callable, logging.Logger or hplot.ProfileSummary
+            receives the stage timings, artist counts and output size of the render
+        :param kwargs["render_budget"]: int or "auto"
+            bytes the render may use, "auto" is half of the available memory, the dpi is lowered,
+            long series are downsampled and heavy artists of vector outputs rasterized to fit
 
         """
         super().__init__(**kwargs)
@@ -60,36 +78,34 @@ class plot_plt(Base):
         self.num_data = None
         self.fig = None
         self.ax = None
-        plt.cla()
-        plt.clf()
-        plt.close()
-        self.__preprocess()
+        self.lines = None
+        self._preprocess()
+
+        if not self._defer:
+            self.run()
 
-        self.run()
+    @classmethod
+    def stream(cls, series: List[Hashable], fname: Optional[str] = None, **kwargs) -> "plot_plt_stream":
+        """
+        create a live figure whose series are extended with plot_plt_stream.append,
+        see plot_plt_stream for the parameters
+        """
+        return plot_plt_stream(series, fname, **kwargs)
 
-    def __preprocess(self):
-        rcParams.update({"mathtext.fontset": "stix"})
+    def _preprocess(self):
         assert isinstance(self.data, (dict, list, tuple))
 
         if isinstance(self.data, dict):
             self.data = [self.data]
         self.num_data = len(self.data)
 
-        # use tex to render fonts, tex install required
-        if hConfig.usetex:
-            from matplotlib import rc
-
-            rc("font", **{"family": "serif", "serif": ["Times New Roman"]})
-            rc("text", usetex=True)
-
         # color list
         cl = self._kwargs.get("color_list", None)
         if (cl is None) or len(cl) < self.num_data:
             tableau_colors = cycle(mcolors.TABLEAU_COLORS)
             self._kwargs["color_list"] = [next(tableau_colors) for _ in range(self.num_data)]
 
-    def plot(self):
-        self.fig, self.ax = plt.subplots(figsize=cm2inch(*hConfig.fig_size), dpi=hConfig.dpi)
+    def _draw(self):
         lws = self._kwargs.get("linewidths", None)
         if lws is not None:
             assert len(self.data) == len(lws)
@@ -100,36 +116,41 @@ class plot_plt(Base):
         # plot figure
         cl = self._kwargs.get("color_list", None)
         assert cl is not None
+        method = self._kwargs.get("downsample", None)
+        self.lines = []
         for i, d in enumerate(self.data):
             lw = lws[i] if lws is not None else 2
             ls = lss[i] if lss is not None else "-"
-            plt.plot(d["x"], d["y"], color=cl[i], linewidth=lw, ls=ls)
+            x, y = d["x"], d["y"]
+            if method is not None:
+                x, y = downsample(x, y, method, self._downsample_points())
+            (line,) = self.ax.plot(x, y, color=cl[i], linewidth=lw, ls=ls)
+            self.lines.append(line)
 
+    def _decorate(self):
         # legend
-        plt.tick_params(labelsize=hConfig.tick_size)
-        labels = self.ax.get_xticklabels() + self.ax.get_yticklabels()
-        [label.set_fontname(hConfig.tick_label_font) for label in labels]
+        style_ticks(self.ax)
 
         if self.legend is not None:
-            plt.legend(
+            self.ax.legend(
                 self.legend,
                 loc=self._kwargs.get("legend_loc", "best"),
                 ncol=self._kwargs.get("legend_ncol", 1),
-                prop=hConfig.legend_font,
+                prop=legend_font(),
             )
 
         #  label
         if self.xlabel is not None:
-            plt.xlabel(self.xlabel, hConfig.label_font)
+            self.ax.set_xlabel(self.xlabel, fontproperties=label_font())
         if self.ylabel is not None:
-            plt.ylabel(self.ylabel, hConfig.label_font)
+            self.ax.set_ylabel(self.ylabel, fontproperties=label_font())
 
         xlim = self._kwargs.get("xlim", None)
         if xlim is not None:
-            plt.xlim(xlim)
+            self.ax.set_xlim(xlim)
         ylim = self._kwargs.get("ylim", None)
         if ylim is not None:
-            plt.ylim(ylim)
+            self.ax.set_ylim(ylim)
 
         xticks = self._kwargs.get("xticks", None)
         yticks = self._kwargs.get("yticks", None)
@@ -137,6 +158,136 @@ class plot_plt(Base):
         ytick_labels = self._kwargs.get("ytick_labels", None)
 
         if xticks is not None and xtick_labels is not None:
-            plt.xticks(xticks, xtick_labels)
+            self.ax.set_xticks(xticks, xtick_labels)
         if yticks is not None and ytick_labels is not None:
-            plt.yticks(yticks, ytick_labels)
+            self.ax.set_yticks(yticks, ytick_labels)
+
+
+class plot_plt_stream(plot_plt):
+    def __init__(
+        self,
+        series: List[Hashable],
+        fname: Optional[str] = None,
+        *,
+        xlabel: Optional[str] = None,
+        ylabel: Optional[str] = None,
+        legend: Optional[List[str]] = None,
+        display: Optional[bool] = False,
+        capacity: int = 4096,
+        **kwargs
+    ):
+        """
+        live plot_plt figure, the figure is created once and new points are appended to its lines
+        :param series: list of ids used by append, one line per id
+        :param fname: str,
+            the figure is saved here by save()
+        :param xlabel: str
+        :param ylabel: str
+        :param legend: list[str]
+        :param display: bool, show the figure in a non-blocking window
+        :param capacity: int, number of points preallocated per series
+        :param kwargs: same as plot_plt, when kwargs["xlim"] or kwargs["ylim"] is given the
+            corresponding limit is kept fixed
+        """
+        Base.__init__(self, **kwargs)
+        self.series = list(series)
+        self.fname = fname
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.legend = legend
+        self.display = display
+
+        self.num_data = None
+        self.fig = None
+        self.ax = None
+        self.lines = None
+        self._index = {s: i for i, s in enumerate(self.series)}
+        self._buffers = [(GrowableBuffer(capacity), GrowableBuffer(capacity)) for _ in self.series]
+        self.data = [dict(x=bx.view, y=by.view) for bx, by in self._buffers]
+        self._background = None
+
+        self._preprocess()
+        with self._rendering():
+            self.plot()
+            for line in self.lines:
+                line.set_animated(True)
+            if self.display:
+                import matplotlib.pyplot as plt
+
+                self._attach_pyplot()
+                plt.show(block=False)
+            self._blit_redraw()
+
+    def append(self, series_id: Hashable, x, y, refresh: bool = True):
+        """
+        append points to one series
+        :param series_id: one of the ids given at construction
+        :param x: scalar or array
+        :param y: scalar or array, same shape as x
+        :param refresh: bool, update the canvas now, pass False to batch several appends
+        """
+        x = np.asarray(x, dtype=float).reshape(-1)
+        y = np.asarray(y, dtype=float).reshape(-1)
+        assert x.shape == y.shape
+        if x.size == 0:
+            return
+        i = self._index[series_id]
+        bx, by = self._buffers[i]
+        bx.extend(x)
+        by.extend(y)
+        self.lines[i].set_data(bx.view, by.view)
+
+        if self._leaves_view(x, y):
+            self._rescale()
+        if refresh:
+            self.refresh()
+
+    def refresh(self):
+        """
+        draw pending appends, a full redraw only happens when the limits changed
+        """
+        with self._rendering():
+            if self._background is None:
+                self._blit_redraw()
+                return
+            canvas = self.fig.canvas
+            canvas.restore_region(self._background)
+            for line in self.lines:
+                self.ax.draw_artist(line)
+            canvas.blit(self.ax.bbox)
+            if self.display:
+                canvas.flush_events()
+
+    def save(self):
+        if self.fname is not None:
+            with self._rendering():
+                super().save()
+                # saving redraws the canvas, the blit background has to be captured again
+                self._blit_redraw()
+
+    def _leaves_view(self, x, y) -> bool:
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        fix_x = self._kwargs.get("xlim", None) is not None
+        fix_y = self._kwargs.get("ylim", None) is not None
+        out_x = not fix_x and (np.nanmin(x) < x0 or np.nanmax(x) > x1)
+        out_y = not fix_y and (np.nanmin(y) < y0 or np.nanmax(y) > y1)
+        return bool(out_x or out_y)
+
+    def _rescale(self):
+        self.ax.relim()
+        self.ax.autoscale_view(
+            scalex=self._kwargs.get("xlim", None) is None,
+            scaley=self._kwargs.get("ylim", None) is None,
+        )
+        self._background = None
+
+    def _blit_redraw(self):
+        canvas = self.fig.canvas
+        canvas.draw()
+        if not canvas.supports_blit:
+            return
+        self._background = canvas.copy_from_bbox(self.fig.bbox)
+        for line in self.lines:
+            self.ax.draw_artist(line)
+        canvas.blit(self.fig.bbox)
@@ -1,17 +1,26 @@
-import os
 from typing import Dict, List, Optional
-import matplotlib.pyplot as plt
 import numpy as np
-import seaborn as sns
-from matplotlib import rcParams
 
-from hplot.config import hConfig
-from hplot.utils import cm2inch
+from hplot.aggregate import DEFAULT_MEMORY_BUDGET, aggregate_runs_chunked, as_runs, load_array, same_x
+from hplot.fonts import label_font, legend_font, style_ticks, title_font
+from hplot.downsample import downsample_indices
 from hplot.base import Base
-from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 
 
 class plot_sns(Base):
+    _redraw_keys = (
+        "data",
+        "linewidths",
+        "linestyles",
+        "estimator",
+        "errorbar",
+        "errorbar_alpha",
+        "memory_budget",
+        "downsample",
+        "downsample_points",
+        "sub_axis",
+    )
+
     def __init__(
         self,
         data: List[Dict],
@@ -34,9 +43,12 @@ class plot_sns(Base):
             when there is repeat experiment data, xi_list=[x1, x2, ..., xd], shape of xi is [d,],
                                                 yi_list=[y1, y2, ..., yd], shape of y is [d,],
                                                 lableli str,
+            arrays may be np.memmap or paths to .npy files, which are opened memory mapped,
+            with errorbar set, yi_list may also be a [runs, d] array and xi_list a single x shared by all runs
         :param fname: fname: str,
             the figure will be saved here,
             example: "./path_to_file/figure.png"
+            a list of paths, e.g. ["./figure.png", "./figure.pdf"], writes all of them from one render
         :param xlabel:  str
         :param ylabel:  str
         :param legend: list[str]
@@ -63,6 +75,29 @@ class plot_sns(Base):
         :param kwargs["ticklabel_style_axis"]: "x" or "y" or "both"
         :param kwargs["log_yaxis"]: bool
         :param kwargs["sub_axis"]: List of dict keys: width, height, loc, borderpad, xlim, ylim, links. link [("ul", "ll"), ("ur", "lr")]
+        :param kwargs["estimator"]: "mean" or "median"
+        :param kwargs["errorbar"]: "sd", "se", "pi", "ci" or a tuple (method, level), such as ("pi", 50)
+            when given, repeated runs are aggregated by hplot in one vectorized pass instead of the
+            seaborn bootstrap, all runs of one curve must share the same x
+        :param kwargs["errorbar_alpha"]: float, alpha of the errorbar band
+        :param kwargs["formats"]: List[str]
+            save fname once per format, e.g. ["png", "pdf", "svg"]
+        :param kwargs["parallel_save"]: bool
+            write the output files with a thread pool
+        :param kwargs["cache"]: RenderCache or str
+            skip rendering when the same inputs were rendered before, a str is the cache directory
+        :param kwargs["profile"]: callable, logging.Logger or hplot.ProfileSummary
+            receives the stage timings, artist counts and output size of the render
+        :param kwargs["render_budget"]: int or "auto"
+            bytes the render may use, "auto" is half of the available memory, the dpi is lowered,
+            long series are downsampled and heavy artists of vector outputs rasterized to fit
+        :param kwargs["memory_budget"]: int
+            bytes of working memory for the errorbar aggregation, runs are read in blocks of points
+        :param kwargs["downsample"]: "lttb" or "minmax"
+            reduce long curves to the resolution of the figure before drawing, the points are
+            selected on the aggregated curve and all runs of one curve must share the same x
+        :param kwargs["downsample_points"]: int
+            maximum number of points per curve, default derived from the width and dpi of the figure
 
         """
         super().__init__(**kwargs)
@@ -77,38 +112,36 @@ class plot_sns(Base):
         self.num_data = None
         self.fig = None
         self.ax = None
-        plt.cla()
-        plt.clf()
-        plt.close()
-        style = kwargs.get("style", "white")
-        sns.set_style(style)
-        self.__preprocess()
+        self._series = None
+        self._preprocess()
+
+        if not self._defer:
+            self.run()
+
+    @classmethod
+    def _style_rc(cls, kwargs: Dict) -> Dict:
+        import seaborn as sns
 
-        self.run()
+        return dict(sns.axes_style(kwargs.get("style", "white")))
 
-    def __preprocess(self):
-        rcParams.update({"mathtext.fontset": "stix"})
+    def _preprocess(self):
         assert isinstance(self.data, (dict, list, tuple))
+        self._series = dict()
 
         if isinstance(self.data, dict):
             self.data = [self.data]
         self.num_data = len(self.data)
 
-        # use tex to render fonts, tex install required
-        if hConfig.usetex:
-            from matplotlib import rc
-
-            rc("font", **{"family": "serif", "serif": ["Times New Roman"]})
-            rc("text", usetex=True)
-
     def _ppc_data(self, d):
         x = d["x"]
         y = d["y"]
         label = d["label"]
-        if isinstance(x, np.ndarray):
+        if not isinstance(x, (list, tuple)):
             x = [x]
-        if isinstance(y, np.ndarray):
+        if not isinstance(y, (list, tuple)):
             y = [y]
+        x = [load_array(xi) for xi in x]
+        y = [load_array(yi) for yi in y]
 
         assert len(x) == len(y)
 
@@ -123,8 +156,81 @@ class plot_sns(Base):
         y = y.reshape(-1)
         return x, y, label
 
-    def plot(self):
-        self.fig, self.ax = plt.subplots(figsize=cm2inch(*hConfig.fig_size), dpi=hConfig.dpi)
+    def _ppc_runs(self, d):
+        y = as_runs(d["y"])
+        label = d["label"]
+        budget = self._kwargs.get("memory_budget", DEFAULT_MEMORY_BUDGET)
+        if isinstance(d["x"], (list, tuple)):
+            x = [load_array(xi).reshape(-1) for xi in d["x"]]
+            assert len(x) == len(y)
+            for xi in x[1:]:
+                assert same_x(x[0], xi, budget), "all runs must share the same x"
+            x = x[0]
+        else:
+            x = load_array(d["x"]).reshape(-1)
+        assert x.shape[0] == y[0].shape[0]
+        return x, y, label
+
+    def _aggregate(self, i):
+        # the aggregation is shared by the main axes and the sub axes
+        if i not in self._series:
+            x, y, label = self._ppc_runs(self.data[i])
+            center, low, high = aggregate_runs_chunked(
+                y,
+                estimator=self._kwargs.get("estimator", "mean"),
+                errorbar=self._kwargs.get("errorbar", None),
+                memory_budget=self._kwargs.get("memory_budget", DEFAULT_MEMORY_BUDGET),
+            )
+            method = self._kwargs.get("downsample", None)
+            if method is not None:
+                idx = downsample_indices(x, center, method, self._downsample_points())
+                x, center = x[idx], center[idx]
+                if low is not None:
+                    low, high = low[idx], high[idx]
+            self._series[i] = (np.asarray(x), center, low, high, label)
+        return self._series[i]
+
+    def _draw_series(self, ax, legend=True):
+        lws = self._kwargs.get("linewidths", None)
+        lss = self._kwargs.get("linestyles", None)
+        estimator = self._kwargs.get("estimator", "mean")
+        errorbar = self._kwargs.get("errorbar", None)
+        alpha = self._kwargs.get("errorbar_alpha", 0.2)
+        method = self._kwargs.get("downsample", None)
+        n_out = self._downsample_points() if method is not None else None
+
+        for i, d in enumerate(self.data):
+            lw = lws[i] if lws is not None else 2
+            ls = lss[i] if lss is not None else "-"
+            if errorbar is None:
+                import seaborn as sns
+
+                if method is None:
+                    x, y, label = self._ppc_data(d)
+                else:
+                    x, y, label = self._ppc_runs(d)
+                    center, _, _ = aggregate_runs_chunked(y, errorbar=None)
+                    idx = downsample_indices(x, center, method, n_out)
+                    x = np.tile(x[idx], len(y))
+                    y = np.concatenate([run[idx] for run in y])
+                sns.lineplot(
+                    x=x,
+                    y=y,
+                    label=label,
+                    linewidth=lw,
+                    ls=ls,
+                    estimator=estimator,
+                    ax=ax,
+                    legend="auto" if legend else False,
+                )
+                continue
+
+            x, center, low, high, label = self._aggregate(i)
+            (line,) = ax.plot(x, center, label=label if legend else None, linewidth=lw, ls=ls)
+            if low is not None:
+                ax.fill_between(x, low, high, color=line.get_color(), alpha=alpha, linewidth=0)
+
+    def _draw(self):
         # plot figure
         lws = self._kwargs.get("linewidths", None)
         if lws is not None:
@@ -134,18 +240,14 @@ class plot_sns(Base):
         if lss is not None:
             assert len(self.data) == len(lss)
 
-        for i, d in enumerate(self.data):
-            x, y, label = self._ppc_data(d)
-            lw = lws[i] if lws is not None else 2
-            ls = lss[i] if lss is not None else "-"
-            sns.lineplot(x=x, y=y, label=label, linewidth=lw, ls=ls)
+        self._draw_series(self.ax)
+        self._draw_sub_axis()
 
+    def _decorate(self):
         if self.title is not None:
-            plt.title(self.title, hConfig.title_font)
+            self.ax.set_title(self.title, fontproperties=title_font())
         # tick
-        plt.tick_params(labelsize=hConfig.tick_size)
-        labels = self.ax.get_xticklabels() + self.ax.get_yticklabels()
-        [label.set_fontname(hConfig.tick_label_font) for label in labels]
+        style_ticks(self.ax)
 
         # set legend
         legend_handles, legend_labels = self.ax.get_legend_handles_labels()
@@ -156,7 +258,7 @@ class plot_sns(Base):
         legend_loc = self._kwargs.get("legend_loc", "best")
         legend_dict["loc"] = "best" if legend_loc is None else legend_loc
         legend_dict["frameon"] = self._kwargs.get("legend_frameon", True)
-        legend_dict["prop"] = hConfig.legend_font
+        legend_dict["prop"] = legend_font()
 
         ncol = self._kwargs.get("legend_ncol", 1)
         if ncol is not None:
@@ -165,20 +267,20 @@ class plot_sns(Base):
         if self._kwargs.get("show_legend", True):
             self.ax.legend(**legend_dict)
         else:
-            plt.legend([], [], frameon=False)
+            self.ax.legend([], [], frameon=False)
 
         #  label
         if self.xlabel is not None:
-            plt.xlabel(self.xlabel, hConfig.label_font)
+            self.ax.set_xlabel(self.xlabel, fontproperties=label_font())
         if self.xlabel is not None:
-            plt.ylabel(self.ylabel, hConfig.label_font)
+            self.ax.set_ylabel(self.ylabel, fontproperties=label_font())
 
         xlim = self._kwargs.get("xlim", None)
         if xlim is not None:
-            plt.xlim(xlim)
+            self.ax.set_xlim(xlim)
         ylim = self._kwargs.get("ylim", None)
         if ylim is not None:
-            plt.ylim(ylim)
+            self.ax.set_ylim(ylim)
 
         xticks = self._kwargs.get("xticks", None)
         yticks = self._kwargs.get("yticks", None)
@@ -186,21 +288,23 @@ class plot_sns(Base):
         ytick_labels = self._kwargs.get("ytick_labels", None)
 
         if xticks is not None and xtick_labels is not None:
-            plt.xticks(xticks, xtick_labels)
+            self.ax.set_xticks(xticks, xtick_labels)
         if yticks is not None and ytick_labels is not None:
-            plt.yticks(yticks, ytick_labels)
+            self.ax.set_yticks(yticks, ytick_labels)
 
         ticklabel_style = self._kwargs.get("ticklabel_style", None)
         ticklabel_style_axis = self._kwargs.get("ticklabel_style_axis", "x")
         if ticklabel_style:
-            plt.ticklabel_format(style=ticklabel_style, axis=ticklabel_style_axis, scilimits=(0, 0))
+            self.ax.ticklabel_format(style=ticklabel_style, axis=ticklabel_style_axis, scilimits=(0, 0))
 
         log_yaxis = self._kwargs.get("log_yaxis", None)
         if log_yaxis is not None:
-            plt.yscale("log")
+            self.ax.set_yscale("log")
 
+    def _draw_sub_axis(self):
         if self._kwargs.get("sub_axis", None) is not None:
             from matplotlib.patches import ConnectionPatch
+            from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 
             for sub_ax_config in self._kwargs.get("sub_axis", None):
                 width = sub_ax_config.get("width", "40%")
@@ -210,22 +314,8 @@ class plot_sns(Base):
                 axins = inset_axes(self.ax, width, height, loc=loc, borderpad=borderpad)
                 # plot original data
                 # plt.gca().set_prop_cycle(None)
-                for i, d in enumerate(self.data):
-                    x, y, label = self._ppc_data(d)
-                    lw = lws[i] if lws is not None else 2
-                    ls = lss[i] if lss is not None else "-"
-                    sns.lineplot(
-                        x=x,
-                        y=y,
-                        label=label,
-                        linewidth=lw,
-                        ls=ls,
-                        ax=axins,
-                        legend=False,
-                    )
-                plt.tick_params(labelsize=hConfig.tick_size)
-                labels = axins.get_xticklabels() + axins.get_yticklabels()
-                [label.set_fontname(hConfig.tick_label_font) for label in labels]
+                self._draw_series(axins, legend=False)
+                style_ticks(axins)
                 # set enlarged zone
                 sub_xlim = sub_ax_config["xlim"]
                 sub_ylim = sub_ax_config["ylim"]
@@ -239,7 +329,6 @@ class plot_sns(Base):
                 ty1 = sub_ylim[1]
                 sx = [tx0, tx1, tx1, tx0, tx0]
                 sy = [ty0, ty0, ty1, ty1, ty0]
-                print(sx, sy)
                 self.ax.plot(sx, sy, "black", lw=1)
 
                 # 画两条线
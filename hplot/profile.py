@@ -0,0 +1,151 @@
+import logging
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+
+STAGES = ("preprocess", "draw", "decorate", "layout", "save", "cache")
+
+
+class RenderProfile(NamedTuple):
+    plotter: str
+    paths: List[str]
+    # stage -> (wall seconds, cpu seconds)
+    stages: Dict[str, tuple]
+    artists: int
+    vertices: int
+    bytes: int
+    cached: bool
+    # what a render budget changed, see kwargs["render_budget"]
+    actions: tuple = ()
+
+    @property
+    def wall(self) -> float:
+        return sum(w for w, _ in self.stages.values())
+
+    def __str__(self):
+        stages = " ".join("{}={:.3f}s".format(k, w) for k, (w, _) in self.stages.items())
+        return "{} {} total={:.3f}s artists={} vertices={} bytes={}{}{}".format(
+            self.plotter,
+            stages,
+            self.wall,
+            self.artists,
+            self.vertices,
+            self.bytes,
+            " (cached)" if self.cached else "",
+            "".join(" [{}]".format(a) for a in self.actions),
+        )
+
+
+class StageTimer:
+    def __init__(self):
+        """
+        wall and cpu time per stage, repeated stages are summed
+        """
+        self.stages = dict()
+
+    def add(self, stage: str, wall: float, cpu: float):
+        w, c = self.stages.get(stage, (0.0, 0.0))
+        self.stages[stage] = (w + wall, c + cpu)
+
+    @contextmanager
+    def stage(self, stage: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - wall, time.process_time() - cpu)
+
+
+def artist_vertices(a) -> int:
+    """
+    number of path vertices and markers drawn for the artist a
+    """
+    from matplotlib.collections import Collection
+    from matplotlib.lines import Line2D
+    from matplotlib.patches import Patch
+
+    if not a.get_visible():
+        return 0
+    if isinstance(a, Line2D):
+        return len(a.get_xydata())
+    if isinstance(a, Collection):
+        paths = a.get_paths()
+        n = sum(len(p.vertices) for p in paths)
+        if len(paths) <= 1:
+            # markers of a scatter share one path
+            n += len(a.get_offsets())
+        return n
+    if isinstance(a, Patch):
+        return len(a.get_path().vertices)
+    return 0
+
+
+def count_artists(fig) -> tuple:
+    """
+    :return: (number of artists, number of path vertices and markers drawn)
+    """
+    artists = fig.findobj()
+    return len(artists) - 1, sum(artist_vertices(a) for a in artists)
+
+
+def deliver(profile: RenderProfile, sink: Union[Callable, logging.Logger]):
+    if isinstance(sink, logging.Logger):
+        sink.info("%s", profile)
+    else:
+        sink(profile)
+
+
+def output_bytes(paths: List[str]) -> int:
+    return sum(os.path.getsize(p) for p in paths if os.path.isfile(p))
+
+
+def _empty_group():
+    return dict(renders=0, cached=0, wall=defaultdict(float), cpu=defaultdict(float), artists=0, vertices=0, bytes=0)
+
+
+class ProfileSummary:
+    def __init__(self):
+        """
+        collects the profiles of many renders, pass it as profile=summary to every plotter
+        example: s = ProfileSummary(); plot_sns(..., profile=s); plot_plt(..., profile=s); print(s.table())
+        """
+        self.profiles = []
+
+    def __call__(self, profile: RenderProfile):
+        self.profiles.append(profile)
+
+    def summary(self, by: Optional[str] = "plotter") -> Dict[str, Dict]:
+        """
+        :param by: "plotter" groups the renders by plotter, None puts all into one group "all"
+        :return: group -> dict(renders, cached, wall per stage, cpu per stage, artists, vertices, bytes), sums
+        """
+        groups = defaultdict(_empty_group)
+        for p in self.profiles:
+            g = groups[p.plotter if by == "plotter" else "all"]
+            g["renders"] += 1
+            g["cached"] += int(p.cached)
+            for stage, (wall, cpu) in p.stages.items():
+                g["wall"][stage] += wall
+                g["cpu"][stage] += cpu
+            g["artists"] += p.artists
+            g["vertices"] += p.vertices
+            g["bytes"] += p.bytes
+        return {k: dict(v, wall=dict(v["wall"]), cpu=dict(v["cpu"])) for k, v in groups.items()}
+
+    def table(self, by: Optional[str] = "plotter") -> str:
+        """
+        total wall time per stage and group, formatted with tabulate
+        """
+        from tabulate import tabulate
+
+        rows = []
+        for name, g in self.summary(by).items():
+            rows.append(
+                [name, g["renders"], g["cached"]]
+                + [g["wall"].get(stage, 0.0) for stage in STAGES]
+                + [sum(g["wall"].values()), g["artists"], g["vertices"], g["bytes"]]
+            )
+        headers = ["plotter", "renders", "cached"] + list(STAGES) + ["total [s]", "artists", "vertices", "bytes"]
+        return tabulate(rows, headers=headers, floatfmt=".3f")
@@ -0,0 +1,248 @@
+import hashlib
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+from hplot.config import hConfig
+from hplot.utils import cm2inch
+
+REDUCE_FUNCS = ("mean", "max", "min")
+
+# bytes of input read at once by block_reduce
+_CHUNK_BYTES = 64 << 20
+
+
+def output_shape(fig_size=None, dpi=None, fig=None) -> Tuple[int, int]:
+    """
+    (rows, columns) of pixels of the whole figure, an upper bound for what a heatmap can show
+    :param fig_size: (width, height) in centimeter, default hConfig.fig_size
+    :param dpi: default hConfig.dpi
+    :param fig: matplotlib Figure, its size and dpi are used instead of fig_size and dpi
+    """
+    if fig is not None:
+        w, h = fig.get_size_inches()
+        dpi = fig.dpi
+    else:
+        fig_size = hConfig.fig_size if fig_size is None else fig_size
+        dpi = hConfig.dpi if dpi is None else dpi
+        w, h = cm2inch(*fig_size)
+    return int(np.ceil(h * dpi)), int(np.ceil(w * dpi))
+
+
+def _reduce_axis(a: np.ndarray, factor: int, func: str, axis: int) -> np.ndarray:
+    edges = np.arange(0, a.shape[axis], factor)
+    if func == "max":
+        return np.fmax.reduceat(a, edges, axis=axis)
+    if func == "min":
+        return np.fmin.reduceat(a, edges, axis=axis)
+    return np.add.reduceat(a, edges, axis=axis)
+
+
+def _reduce_blocks(a: np.ndarray, fy: int, fx: int, func: str) -> np.ndarray:
+    if fy > 1:
+        a = _reduce_axis(a, fy, func, axis=0)
+    if fx > 1:
+        a = _reduce_axis(a, fx, func, axis=1)
+    return a
+
+
+def _chunks(z: np.ndarray, fy: int):
+    """
+    rows of z in chunks of whole blocks, so memmaps are not loaded at once
+    """
+    ny, nx = z.shape
+    rows = max(fy, (_CHUNK_BYTES // max(nx * 8, 1)) // fy * fy)
+    for start in range(0, ny, rows):
+        yield np.asarray(z[start : start + rows], dtype=float)
+
+
+def _sum_blocks(z: np.ndarray, factors: Tuple[int, int]) -> np.ndarray:
+    fy, fx = int(factors[0]), int(factors[1])
+    return np.concatenate([_reduce_blocks(block, fy, fx, "sum") for block in _chunks(z, fy)], axis=0)
+
+
+def block_sums(z: np.ndarray, factors: Tuple[int, int]) -> np.ndarray:
+    """
+    sums and counts of the valid cells of every block, nan values are ignored
+    :param z: array, shape [ny, nx]
+    :param factors: (fy, fx)
+    :return: array, shape [2, ceil(ny / fy), ceil(nx / fx)]
+    """
+    fy, fx = int(factors[0]), int(factors[1])
+    out = []
+    for block in _chunks(z, fy):
+        valid = ~np.isnan(block)
+        total = _reduce_blocks(np.where(valid, block, 0.0), fy, fx, "sum")
+        out.append(np.stack([total, _reduce_blocks(valid.astype(float), fy, fx, "sum")]))
+    return np.concatenate(out, axis=1)
+
+
+def block_reduce(z: np.ndarray, factors: Tuple[int, int], func: str = "mean") -> np.ndarray:
+    """
+    reduce blocks of factors[0] x factors[1] cells to one cell, nan values are ignored,
+    the last block of an axis may be smaller, z is read in row chunks so memmaps are not loaded at once
+    :param z: array, shape [ny, nx]
+    :param factors: (fy, fx)
+    :param func: "mean", "max" or "min"
+    :return: array, shape [ceil(ny / fy), ceil(nx / fx)]
+    """
+    assert func in REDUCE_FUNCS, "reduce must be one of {}".format(REDUCE_FUNCS)
+    if func == "mean":
+        # sums and counts of valid cells are reduced separately, a mean of means is off for blocks with nan
+        total, count = block_sums(z, factors)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return total / count
+    fy, fx = int(factors[0]), int(factors[1])
+    return np.concatenate([_reduce_blocks(block, fy, fx, func) for block in _chunks(z, fy)], axis=0)
+
+
+def is_sparse(z) -> bool:
+    # without importing scipy, which is only loaded by callers passing sparse matrices
+    return type(z).__module__.startswith("scipy.sparse")
+
+
+def sparse_block_reduce(z, factors: Tuple[int, int], func: str = "mean") -> np.ndarray:
+    """
+    block_reduce of a scipy.sparse matrix, only the stored entries are visited so memory scales with nnz,
+    implicit zeros count as values of their block, stored nan values are ignored
+    :param z: scipy.sparse matrix or array, shape [ny, nx]
+    :param factors: (fy, fx)
+    :param func: "mean", "max" or "min"
+    :return: array, shape [ceil(ny / fy), ceil(nx / fx)]
+    """
+    assert func in REDUCE_FUNCS, "reduce must be one of {}".format(REDUCE_FUNCS)
+    fy, fx = int(factors[0]), int(factors[1])
+    ny, nx = z.shape
+    shape = (-(-ny // fy), -(-nx // fx))
+    coo = z.tocoo()
+    block = (coo.row // fy) * shape[1] + coo.col // fx
+    data = np.asarray(coo.data, dtype=float)
+    valid = ~np.isnan(data)
+
+    # cells per block, the last block of an axis may be smaller
+    rows = np.minimum(fy, ny - np.arange(shape[0]) * fy)
+    cols = np.minimum(fx, nx - np.arange(shape[1]) * fx)
+    cells = np.outer(rows, cols).reshape(-1)
+    n_nan = np.bincount(block[~valid], minlength=cells.shape[0])
+
+    if func == "mean":
+        total = np.bincount(block[valid], weights=data[valid], minlength=cells.shape[0])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (total / (cells - n_nan)).reshape(shape)
+
+    # duplicate entries of a coo matrix are summed like in toarray()
+    if not coo.has_canonical_format:
+        coo = coo.copy()
+        coo.sum_duplicates()
+        block = (coo.row // fy) * shape[1] + coo.col // fx
+        data = np.asarray(coo.data, dtype=float)
+        valid = ~np.isnan(data)
+    n_stored = np.bincount(block, minlength=cells.shape[0])
+    ufunc = np.fmax if func == "max" else np.fmin
+    # blocks with implicit zeros start from 0, fully stored blocks from the first valid value
+    out = np.where(n_stored < cells, 0.0, np.nan)
+    ufunc.at(out, block[valid], data[valid])
+    return out.reshape(shape)
+
+
+def reduce_axis_values(v: np.ndarray, factor: int) -> np.ndarray:
+    """
+    coordinate of each reduced block, the mean of the coordinates it covers
+    """
+    v = np.asarray(v, dtype=float).reshape(-1)
+    if factor <= 1:
+        return v
+    edges = np.arange(0, v.shape[0], factor)
+    return np.add.reduceat(v, edges) / np.diff(np.append(edges, v.shape[0]))
+
+
+def reduce_factors(shape: Tuple[int, int], target: Tuple[int, int]) -> Tuple[int, int]:
+    return max(1, int(np.ceil(shape[0] / target[0]))), max(1, int(np.ceil(shape[1] / target[1])))
+
+
+class Pyramid:
+    def __init__(self, directory: str):
+        """
+        on disk cache of 2x reduced levels of memmapped inputs, so that rendering the same input
+        at a different size starts from the closest level instead of the full array
+        :param directory: str
+        """
+        self.directory = directory
+
+    def _key(self, z: np.memmap, func: str) -> str:
+        stat = os.stat(z.filename)
+        # the levels of "mean" hold sums and counts
+        level = "sum_count" if func == "mean" else func
+        desc = (os.path.abspath(z.filename), stat.st_size, stat.st_mtime_ns, z.offset, z.shape, z.dtype.str, level)
+        return hashlib.blake2b(repr(desc).encode(), digest_size=16).hexdigest()
+
+    def level(self, z: np.memmap, k: int, func: str) -> np.ndarray:
+        """
+        z reduced by 2 ** k on both axes, built from level k - 1 and stored on first use,
+        a level of "mean" holds the sums and the counts of valid cells, shape [2, ny, nx], so that the means
+        of every level equal block_reduce of z and not a mean of means
+        """
+        if k == 0:
+            return z
+        path = os.path.join(self.directory, "{}_{}.npy".format(self._key(z, func), k))
+        if not os.path.isfile(path):
+            below = self.level(z, k - 1, func)
+            if func != "mean":
+                reduced = block_reduce(below, (2, 2), func)
+            elif k == 1:
+                reduced = block_sums(below, (2, 2))
+            else:
+                reduced = np.stack([_sum_blocks(part, (2, 2)) for part in below])
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = path + ".{}.tmp.npy".format(os.getpid())
+            np.save(tmp, reduced)
+            os.replace(tmp, path)
+        return np.load(path, mmap_mode="r")
+
+    def reduce(self, z: np.memmap, factors: Tuple[int, int], func: str = "mean") -> np.ndarray:
+        k = int(np.floor(np.log2(max(1, min(factors)))))
+        base = self.level(z, k, func)
+        rest = (int(np.ceil(factors[0] / 2**k)), int(np.ceil(factors[1] / 2**k)))
+        if func == "mean" and k > 0:
+            total, count = (_sum_blocks(part, rest) for part in base)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return total / count
+        if rest == (1, 1):
+            return np.asarray(base)
+        return block_reduce(base, rest, func)
+
+
+def decimate(
+    x,
+    y,
+    z,
+    func: str = "mean",
+    target: Optional[Tuple[int, int]] = None,
+    pyramid_dir: Optional[str] = None,
+):
+    """
+    reduce a grid to at most target cells, z is returned unchanged when it already fits
+    :param x: array, shape [nx,]
+    :param y: array, shape [ny,]
+    :param z: array or scipy.sparse matrix, shape [ny, nx]
+    :param func: "mean", "max" or "min"
+    :param target: (rows, columns), default output_shape()
+    :param pyramid_dir: str, keep reduced levels of memmapped z in this directory
+    :return: (x, y, z), z is dense
+    """
+    target = output_shape() if target is None else target
+    factors = reduce_factors(z.shape, target)
+    if factors == (1, 1):
+        return x, y, z.toarray() if is_sparse(z) else z
+    if is_sparse(z):
+        fy, fx = factors
+        z = sparse_block_reduce(z, factors, func)
+    elif pyramid_dir is not None and isinstance(z, np.memmap) and z.filename is not None:
+        fy = fx = 2 ** int(np.floor(np.log2(max(1, min(factors)))))
+        fy, fx = fy * int(np.ceil(factors[0] / fy)), fx * int(np.ceil(factors[1] / fx))
+        z = Pyramid(pyramid_dir).reduce(z, factors, func)
+    else:
+        fy, fx = factors
+        z = block_reduce(z, factors, func)
+    return reduce_axis_values(x, fx), reduce_axis_values(y, fy), z
@@ -0,0 +1,303 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+ENGINES = ("seaborn", "exact", "sketch", "auto")
+
+# samples per group up to which engine="auto" computes exact statistics
+EXACT_THRESHOLD = 1 << 20
+
+# samples read at once from memmapped inputs
+_CHUNK_SIZE = 1 << 20
+
+
+class KLLSketch:
+    def __init__(self, k: int = 200, seed: Optional[int] = 0):
+        """
+        mergeable quantile sketch of Karnin, Lang and Liberty, the memory is O(k) items independent of the
+        number of samples, the rank error is about 1.7 / k with high probability
+        items of level h stand for 2 ** h samples, a full level is sorted and every other item is promoted
+        :param k: int, capacity of the top level
+        :param seed: int, seed of the random offsets of the compactions
+        """
+        self.k = k
+        self._rng = np.random.default_rng(seed)
+        self._levels = [np.empty(0)]
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self._levels) - h - 1
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self._levels):
+            level = self._levels[h]
+            if level.shape[0] > self._capacity(h):
+                if h + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                level = np.sort(level)
+                # an odd item stays on this level
+                keep = level[:1] if level.shape[0] % 2 else level[:0]
+                level = level[keep.shape[0] :]
+                promoted = level[self._rng.integers(2) :: 2]
+                self._levels[h] = keep
+                self._levels[h + 1] = np.concatenate([self._levels[h + 1], promoted])
+                # the capacities of lower levels shrink when a level is added, start over
+                h = 0
+                continue
+            h += 1
+
+    def update(self, values) -> "KLLSketch":
+        """
+        add a chunk of samples, nan values are ignored
+        """
+        values = np.asarray(values, dtype=float).reshape(-1)
+        values = values[~np.isnan(values)]
+        if values.shape[0] == 0:
+            return self
+        self.count += values.shape[0]
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        # add in pieces of the top capacity, so that a large chunk is not sorted at once
+        step = max(self.k, self._capacity(0)) * 64
+        for start in range(0, values.shape[0], step):
+            self._levels[0] = np.concatenate([self._levels[0], values[start : start + step]])
+            self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """
+        add the samples summarized by other, e.g. a sketch built by another process
+        """
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for h, level in enumerate(other._levels):
+            self._levels[h] = np.concatenate([self._levels[h], level])
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def items(self):
+        """
+        :return: (sorted items, their weights)
+        """
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(level.shape[0], 2.0**h) for h, level in enumerate(self._levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def quantile(self, q):
+        """
+        :param q: float or array in [0, 1]
+        :return: approximate quantiles, q = 0 and q = 1 return the exact minimum and maximum
+        """
+        assert self.count > 0, "quantile of an empty sketch"
+        values, weights = self.items()
+        cum = np.cumsum(weights)
+        q = np.asarray(q, dtype=float)
+        idx = np.searchsorted(cum, q * cum[-1], side="left").clip(0, values.shape[0] - 1)
+        out = np.where(q <= 0, self.min, np.where(q >= 1, self.max, values[idx]))
+        return out if out.ndim else float(out)
+
+
+def iter_chunks(y, chunk_size: int = _CHUNK_SIZE) -> Iterable[np.ndarray]:
+    """
+    :param y: array, memmap or .npy path, read chunk_size samples at a time
+    """
+    from hplot.aggregate import load_array
+
+    y = load_array(y).reshape(-1)
+    for start in range(0, y.shape[0], chunk_size):
+        yield np.asarray(y[start : start + chunk_size], dtype=float)
+
+
+def _whiskers(q1: float, q3: float, whis: float, values: np.ndarray, vmin: float, vmax: float):
+    # like matplotlib.cbook.boxplot_stats, the most extreme samples within whis * iqr of the box
+    iqr = q3 - q1
+    lo, hi = q1 - whis * iqr, q3 + whis * iqr
+    inside = values[(values >= lo) & (values <= hi)]
+    whislo = vmin if vmin >= lo else (inside.min() if inside.shape[0] else q1)
+    whishi = vmax if vmax <= hi else (inside.max() if inside.shape[0] else q3)
+    return float(min(whislo, q1)), float(max(whishi, q3))
+
+
+def exact_stats(y: np.ndarray, label=None, whis: float = 1.5) -> Dict:
+    """
+    the statistics sns.boxplot draws, all samples are loaded
+    """
+    y = np.asarray(y, dtype=float).reshape(-1)
+    return grouped_box_stats(y, np.zeros(y.shape[0], dtype=np.int64), 1, [label], whis)[0]
+
+
+def sketch_stats(sketch: KLLSketch, label=None, whis: float = 1.5) -> Dict:
+    """
+    box statistics of a sketch in the format of matplotlib.cbook.boxplot_stats, for Axes.bxp
+    the whiskers are the most extreme retained items within whis * iqr, or the exact minimum / maximum,
+    the fliers are the retained items outside the whiskers, a sample of the outliers, and the extremes
+    """
+    q1, med, q3 = sketch.quantile([0.25, 0.5, 0.75])
+    values, _ = sketch.items()
+    whislo, whishi = _whiskers(q1, q3, whis, values, sketch.min, sketch.max)
+    fliers = values[(values < whislo) | (values > whishi)]
+    extremes = [v for v in (sketch.min, sketch.max) if v < whislo or v > whishi]
+    return dict(
+        label=label,
+        mean=sketch.total / sketch.count,
+        med=float(med),
+        q1=float(q1),
+        q3=float(q3),
+        iqr=float(q3 - q1),
+        whislo=whislo,
+        whishi=whishi,
+        fliers=np.unique(np.concatenate([fliers, extremes])),
+    )
+
+
+def split_groups(values, groups, n_groups: Optional[int] = None) -> List[np.ndarray]:
+    """
+    long form samples to one array per group, with a single stable sort
+    :param values: array, shape [n,]
+    :param groups: int array, shape [n,], group index of each value
+    :return: list of n_groups arrays
+    """
+    values = np.asarray(values, dtype=float).reshape(-1)
+    groups = np.asarray(groups).reshape(-1)
+    counts = np.bincount(groups, minlength=n_groups or 0)
+    order = np.argsort(groups, kind="stable")
+    return np.split(values[order], np.cumsum(counts)[:-1])
+
+
+def grouped_box_stats(
+    values,
+    groups,
+    n_groups: Optional[int] = None,
+    labels: Optional[Sequence] = None,
+    whis: float = 1.5,
+) -> List[Dict]:
+    """
+    exact box statistics of all groups in one vectorized pass, the same values as matplotlib.cbook.boxplot_stats
+    samples are sorted once by (group, value), quartiles are interpolated within each group's segment
+    and whiskers and fliers are found with segment reductions
+    :param values: array, shape [n,], nan values are ignored
+    :param groups: int array, shape [n,], group index of each value
+    :param n_groups: int, default groups.max() + 1
+    :param labels: labels of the groups, default the group index
+    :param whis: float, whisker length in units of the interquartile range
+    :return: list of dicts, see matplotlib.cbook.boxplot_stats
+    """
+    values = np.asarray(values, dtype=float).reshape(-1)
+    groups = np.asarray(groups, dtype=np.int64).reshape(-1)
+    assert values.shape == groups.shape, "values and groups must have the same length"
+    if n_groups is None:
+        n_groups = int(groups.max()) + 1 if groups.shape[0] else 0
+    labels = list(range(n_groups)) if labels is None else list(labels)
+    assert len(labels) == n_groups, "one label per group"
+
+    valid = ~np.isnan(values)
+    values, groups = values[valid], groups[valid]
+    order = np.lexsort((values, groups))
+    v, g = values[order], groups[order]
+    counts = np.bincount(g, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    last = np.maximum(starts + counts - 1, starts)
+    filled = counts > 0
+    v_pad = np.append(v, np.nan)
+
+    def percentile(q):
+        # linear interpolation, like np.percentile
+        pos = starts + q * np.maximum(counts - 1, 0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, last)
+        frac = pos - lo
+        return np.where(filled, v_pad[lo] + (v_pad[hi] - v_pad[lo]) * frac, np.nan)
+
+    q1, med, q3 = percentile(0.25), percentile(0.5), percentile(0.75)
+    iqr = q3 - q1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(g, weights=v, minlength=n_groups) / counts
+    loval, hival = q1 - whis * iqr, q3 + whis * iqr
+
+    whislo, whishi = q1.copy(), q3.copy()
+    if v.shape[0]:
+        seg = starts[filled]
+        lo = np.full(n_groups, np.inf)
+        lo[filled] = np.minimum.reduceat(np.where(v >= loval[g], v, np.inf), seg)
+        hi = np.full(n_groups, -np.inf)
+        hi[filled] = np.maximum.reduceat(np.where(v <= hival[g], v, -np.inf), seg)
+        # like cbook, a whisker never ends inside the box
+        whislo = np.where(lo > q1, q1, lo)
+        whishi = np.where(hi < q3, q3, hi)
+
+    outside = (v < whislo[g]) | (v > whishi[g])
+    fliers, flier_groups = v[outside], g[outside]
+    bounds = np.searchsorted(flier_groups, np.arange(n_groups + 1))
+
+    return [
+        dict(
+            label=labels[i],
+            mean=mean[i],
+            med=med[i],
+            q1=q1[i],
+            q3=q3[i],
+            iqr=iqr[i],
+            cilo=med[i] - 1.57 * iqr[i] / np.sqrt(counts[i]) if counts[i] else np.nan,
+            cihi=med[i] + 1.57 * iqr[i] / np.sqrt(counts[i]) if counts[i] else np.nan,
+            whislo=whislo[i],
+            whishi=whishi[i],
+            fliers=fliers[bounds[i] : bounds[i + 1]],
+        )
+        for i in range(n_groups)
+    ]
+
+
+def resolve_engine(y=None, chunks=None, engine: str = "auto") -> str:
+    """
+    "exact" or "sketch" for one group, "auto" is exact for an array or memmap y up to EXACT_THRESHOLD samples,
+    chunks and .npy paths are streamed
+    """
+    if engine != "auto":
+        return engine
+    # the size of a memmap is known without reading it, a small one is loaded like an array
+    sized = y is not None and isinstance(y, (list, tuple, np.ndarray))
+    return "exact" if sized and np.size(y) <= EXACT_THRESHOLD else "sketch"
+
+
+def box_stats(
+    y=None,
+    chunks: Optional[Iterable] = None,
+    label=None,
+    engine: str = "auto",
+    whis: float = 1.5,
+    k: int = 200,
+    chunk_size: int = _CHUNK_SIZE,
+) -> Dict:
+    """
+    box statistics of one group
+    :param y: array, memmap or .npy path
+    :param chunks: iterable of arrays, used instead of y for streamed samples, read once
+    :param engine: "exact" loads all samples, "sketch" streams them through a KLLSketch,
+        "auto" is exact up to EXACT_THRESHOLD samples of an array or memmap y
+    :param whis: float, whisker length in units of the interquartile range
+    :param k: int, sketch size
+    :param chunk_size: int, samples read at once from y
+    :return: dict, see matplotlib.cbook.boxplot_stats
+    """
+    assert (y is None) != (chunks is None), "give one of y and chunks"
+    engine = resolve_engine(y, chunks, engine)
+
+    if chunks is None:
+        chunks = iter_chunks(y, chunk_size)
+    if engine == "exact":
+        return exact_stats(np.concatenate([np.asarray(c, dtype=float).reshape(-1) for c in chunks]), label, whis)
+    sketch = KLLSketch(k)
+    for c in chunks:
+        sketch.update(c)
+    return sketch_stats(sketch, label, whis)
@@ -0,0 +1,148 @@
+"""
+text of usetex mode (hConfig.usetex)
+
+matplotlib compiles every string through latex and dvipng into TexManager.texcache, the files are named by a hash
+of the string, the font size, the dpi and the latex preamble (which holds the font config), so the directory is
+a persistent cache that any number of processes may share, hConfig.tex_cache points all renders to one directory
+
+with hConfig.tex_fallback, texts that do not need latex, plain text and math that mathtext can parse
+(e.g. the tick labels), are drawn with mathtext and never compiled
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterable, List, Optional, Set, Tuple, Union
+
+from matplotlib.cbook import is_math_text
+from matplotlib.mathtext import MathTextParser
+from matplotlib.texmanager import TexManager
+from matplotlib.text import Text
+
+from hplot.config import hConfig
+
+# rc of usetex mode, STIXGeneral (shipped with matplotlib) draws the mathtext fallback where Times New Roman
+# is missing, latex does not know either name and keeps its default font
+RC = {"font.family": "serif", "font.serif": ["Times New Roman", "STIXGeneral"], "text.usetex": True}
+
+_DEFAULT_CACHE = TexManager.texcache
+_PARSER = MathTextParser("path")
+
+
+@contextmanager
+def cache_dir():
+    """
+    point matplotlib to hConfig.tex_cache, or its own default cache, in this context only,
+    TexManager.texcache is global to the process, enter it inside hplot.base.apply_rc with the usetex rc
+    :return: the cache directory
+    """
+    path = _DEFAULT_CACHE if hConfig.tex_cache is None else os.path.abspath(os.path.expanduser(hConfig.tex_cache))
+    os.makedirs(path, exist_ok=True)
+    previous = TexManager.texcache
+    TexManager.texcache = path
+    try:
+        yield path
+    finally:
+        TexManager.texcache = previous
+
+
+@lru_cache(maxsize=4096)
+def needs_tex(s: str) -> bool:
+    """
+    whether s needs latex, plain text and math that mathtext can parse do not
+    """
+    if not is_math_text(s):
+        return "\\" in s
+    try:
+        _PARSER.parse(s)
+    except ValueError:
+        return True
+    return False
+
+
+def fallback(fig):
+    """
+    draw the texts of fig that do not need latex with mathtext, ticks added while drawing copy the first tick,
+    whose text is produced by the tick formatter and is mathtext
+    """
+    if not hConfig.tex_fallback:
+        return
+    for t in fig.findobj(Text):
+        if t.get_usetex() and not needs_tex(t.get_text()):
+            t.set_usetex(False)
+
+
+def _compile(text: Tuple[str, float], dpi: float) -> bool:
+    try:
+        TexManager.make_png(text[0], text[1], dpi)
+    except (RuntimeError, OSError):
+        # reported by the render that needs the text
+        return False
+    return True
+
+
+def precompile(texts: Iterable[Tuple[str, float]], dpi: Optional[float] = None, workers: Optional[int] = None) -> int:
+    """
+    compile texts into the cache before rendering, latex and dvipng run as processes, so threads run them in parallel
+    :param texts: (string, font size in points), every line of a string is compiled on its own as matplotlib does
+    :param dpi: float, default hConfig.dpi
+    :param workers: int, default os.cpu_count()
+    :return: number of texts compiled
+    """
+    todo = sorted(
+        {
+            (line, float(size))
+            for s, size in texts
+            for line in s.split("\n")
+            if line.strip() and (not hConfig.tex_fallback or needs_tex(line))
+        }
+    )
+    if not todo:
+        return 0
+    dpi = hConfig.dpi if dpi is None else dpi
+    from hplot.base import apply_rc
+
+    # the preamble, part of the cache key, is taken from rcParams
+    with apply_rc(RC), cache_dir():
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            return sum(executor.map(lambda t: _compile(t, dpi), todo))
+
+
+def _strings(value) -> List[str]:
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [v for v in value if isinstance(v, str)]
+    return []
+
+
+def job_texts(jobs: List[Union[dict, tuple]]) -> Set[Tuple[str, float]]:
+    """
+    labels, titles and legend entries of render_many jobs with their font size, read from the arguments
+    without building the plotters
+    """
+    import inspect
+
+    from hplot.batch import resolve_plotter, parse_job
+    from hplot.fonts import label_font, legend_font, title_font
+
+    label, legend, title = (f().get_size_in_points() for f in (label_font, legend_font, title_font))
+    texts = set()
+    for job in jobs:
+        plotter, args, kwargs = parse_job(job)
+        try:
+            bound = inspect.signature(resolve_plotter(plotter)).bind_partial(*args, **kwargs).arguments
+        except TypeError:
+            # the job fails in its worker and reports it there
+            continue
+        for key in ("xlabel", "ylabel", "y2label"):
+            texts.update((s, label) for s in _strings(bound.get(key, None)))
+        for key in ("title", "titles"):
+            texts.update((s, title) for s in _strings(bound.get(key, None)))
+        texts.update((s, legend) for s in _strings(bound.get("legend", None)))
+        data = bound.get("data", None)
+        for d in [data] if isinstance(data, dict) else data if isinstance(data, (list, tuple)) else []:
+            if isinstance(d, dict):
+                texts.update((s, legend) for s in _strings(d.get("label", None)))
+        texts.update(job_texts(bound.get("panels", None) or []))
+    return texts
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def cm2inch(*tupl):
     """
     length unit conversion： cm --> inch
@@ -21,3 +24,27 @@ def get_default_config(kwargs, config, key):
     if value is None:
         value = getattr(config, key)
     return value
+
+
+class GrowableBuffer:
+    """
+    1-d float buffer with amortized O(1) append, the capacity doubles when it is full
+    """
+
+    def __init__(self, capacity: int = 1024, dtype=float):
+        self._data = np.empty(max(int(capacity), 1), dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype).reshape(-1)
+        end = self.size + values.shape[0]
+        if end > self._data.shape[0]:
+            data = np.empty(max(end, 2 * self._data.shape[0]), dtype=self._data.dtype)
+            data[: self.size] = self._data[: self.size]
+            self._data = data
+        self._data[self.size : end] = values
+        self.size = end
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[: self.size]
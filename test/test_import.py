@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+# wall clock budget in seconds for `import hplot` plus the first plot_plt access, generous for slow machines
+IMPORT_BUDGET = float(os.environ.get("HPLOT_IMPORT_BUDGET", "10.0"))
+
+# `import hplot` must not load the plotting stack, plot_plt and plot_legend need matplotlib only
+_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import hplot
+after_package = sorted(m for m in ("matplotlib.pyplot", "seaborn", "pandas", "scipy") if m in sys.modules)
+hplot.plot_plt, hplot.plot_legend
+elapsed = time.perf_counter() - start
+after_plotter = sorted(m for m in ("matplotlib.pyplot", "seaborn", "pandas", "scipy", "mpl_toolkits.axes_grid1") if m in sys.modules)
+print(json.dumps(dict(elapsed=elapsed, after_package=after_package, after_plotter=after_plotter)))
+"""
+
+
+def _root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_lazy():
+    out = subprocess.run(
+        [sys.executable, "-c", _CODE], cwd=_root(), capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    assert result["after_package"] == [], result
+    assert result["after_plotter"] == [], result
+    assert result["elapsed"] < IMPORT_BUDGET, result
+
+
+def test_import_config():
+    # the config submodule is not shadowed by a package attribute of the same name
+    code = "import hplot.config as c, hplot; assert c.hConfig is hplot.config.hConfig and callable(hplot.use_config)"
+    subprocess.run([sys.executable, "-c", code], cwd=_root(), check=True)
+
+
+if __name__ == "__main__":
+    test_import_lazy()
+    test_import_config()
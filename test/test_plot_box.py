@@ -11,6 +11,76 @@ def test_plot_box():
 
     plot_box(data, fname="figure/plot_box_example.png", display=False, width=0.2, linewidth=0.1)
 
+    p = plot_box.build(data, engine="exact")
+    p.render()
+    top = p.ax.get_ylim()[1]
+    # the statistics are kept for a new width and recomputed for new data
+    p.render(width=0.3)
+    assert p.ax.get_ylim()[1] == top
+    p.render(data=[{"label": "a", "y": d1 * 10}, {"label": "b", "y": d2 * 10}])
+    assert p.ax.get_ylim()[1] > 5 * top
+    p.close()
+
+
+def test_plot_box_sketch(tmp_path):
+    from hplot.quantile import EXACT_THRESHOLD, KLLSketch, resolve_engine
+
+    rng = np.random.default_rng(0)
+    y = rng.lognormal(size=1000000)
+    sketch = KLLSketch(200)
+    for chunk in np.array_split(y, 10):
+        sketch.update(chunk)
+    ranks = np.searchsorted(np.sort(y), sketch.quantile([0.25, 0.5, 0.75])) / y.shape[0]
+    assert np.all(np.abs(ranks - [0.25, 0.5, 0.75]) < 0.01)
+    assert sketch.quantile(0) == y.min() and sketch.quantile(1) == y.max()
+
+    np.save(str(tmp_path / "b.npy"), y * 2)
+    data = [
+        {"label": "a", "y": y[:1000]},
+        {"label": "b", "y": str(tmp_path / "b.npy")},
+        {"label": "c", "chunks": (rng.normal(size=100000) for _ in range(10))},
+    ]
+    p = plot_box.build(data, fname=str(tmp_path / "plot_box_sketch_example.png"), engine="auto")
+    p.render()
+    p.render(width=0.3)
+    p.close()
+
+    # memmaps are sized like arrays, only the large one is streamed
+    small = np.load(str(tmp_path / "b.npy"), mmap_mode="r")[:1000]
+    large = np.lib.format.open_memmap(str(tmp_path / "c.npy"), mode="w+", shape=(EXACT_THRESHOLD + 1,))
+    assert resolve_engine(small) == "exact" and resolve_engine(large) == "sketch"
+    assert resolve_engine(str(tmp_path / "b.npy")) == "sketch"
+
+
+def test_plot_box_grouped(tmp_path):
+    from matplotlib import cbook
+
+    from hplot.quantile import grouped_box_stats
+
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 300, size=2000)
+    groups = np.repeat(np.arange(sizes.shape[0]), sizes)
+    values = rng.standard_normal(groups.shape[0]) * (1 + groups % 7)
+    perm = rng.permutation(values.shape[0])
+    values, groups = values[perm], groups[perm]
+
+    stats = grouped_box_stats(values, groups)
+    for i in (0, 1, 999, 1999):
+        ref = cbook.boxplot_stats(values[groups == i])[0]
+        for k in ("med", "q1", "q3", "whislo", "whishi"):
+            assert np.isclose(stats[i][k], ref[k])
+        assert np.allclose(np.sort(stats[i]["fliers"]), np.sort(ref["fliers"]))
+
+    plot_box(
+        dict(values=values, groups=groups),
+        fname=str(tmp_path / "plot_box_grouped_example.png"),
+        engine="exact",
+        width=0.6,
+        linewidth=0.2,
+    )
+    ragged = [{"label": "a", "y": values[:100]}, {"label": "b", "y": values[:30]}]
+    plot_box(ragged, fname=str(tmp_path / "plot_box_ragged_example.png"))
+
 
 if __name__ == "__main__":
     test_plot_box()
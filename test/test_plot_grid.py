@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+from hplot import plot_grid, plot_heatmap, plot_sns
+
+
+def test_plot_grid(tmp_path):
+    x = np.linspace(-2, 2, 200)
+    panels = []
+    for i in range(12):
+        ys = [np.sin(2 * 3.14 * x + i) + 0.3 * np.random.randn(*x.shape) for _ in range(3)]
+        zs = [np.cos(2 * 3.14 * x + i) + 0.3 * np.random.randn(*x.shape) for _ in range(3)]
+        data = [dict(x=[x] * 3, y=ys, label="sin"), dict(x=[x] * 3, y=zs, label="cos")]
+        panels.append(dict(plotter=plot_sns, args=(data, None), kwargs=dict(xlabel="x", errorbar="sd")))
+    p = plot_grid.build(
+        panels,
+        str(tmp_path / "plot_grid_example.png"),
+        ncols=4,
+        sharex=True,
+        sharey=True,
+        titles=["env {}".format(i) for i in range(12)],
+        legend=True,
+    )
+    p.render()
+    assert len(p.fig.legends) == 1 and all(ax.get_legend() is None for ax in p.axes.flat)
+    p.render(titles=["task {}".format(i) for i in range(12)])
+    p.close()
+
+    x = np.linspace(-10, 10, 50)
+    X, Y = np.meshgrid(x, x)
+    panels = [
+        (plot_heatmap, (x, x, X**2 + i * Y**2, None), dict(vmin=0, vmax=200, backend="image")) for i in range(5)
+    ]
+    p = plot_grid.build(panels, str(tmp_path / "plot_grid_heatmap_example.png"), ncols=3, colorbar=True)
+    p.render()
+    # 2 x 3 panels, the last one hidden, and one colorbar for the grid instead of one per panel
+    assert len(p.fig.axes) == 7 and not p.axes[1, 2].get_visible()
+    images = [im for ax in p.axes.flat for im in ax.images]
+    assert len(images) == 5 and all(im.get_clim() == (0, 200) for im in images)
+    assert os.path.isfile(str(tmp_path / "plot_grid_heatmap_example.png"))
+    # a redraw replaces the panels and keeps the single colorbar
+    p.render(ncols=2)
+    assert len(p.fig.axes) == 7 and sum(len(ax.images) for ax in p.axes.flat) == 5
+    p.close()
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    test_plot_grid(pathlib.Path(tempfile.mkdtemp()))
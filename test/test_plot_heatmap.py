@@ -1,7 +1,12 @@
+import os
+
 import numpy as np
 import pytest
 
 from hplot import plot_heatmap
+from hplot.config import hConfig
+from hplot.grid import evaluate_grid
+from hplot.pyramid import block_reduce, decimate, output_shape, reduce_factors, sparse_block_reduce
 
 
 def test_plot_sns():
@@ -24,5 +29,239 @@ def test_plot_sns():
     )
 
 
+def test_plot_heatmap_image(tmp_path):
+    x = np.linspace(-10, 10, 400)
+    y = np.linspace(-5, 5, 300)
+    X, Y = np.meshgrid(x, y)
+    Z = X**2 + Y**2
+    plot_heatmap(
+        x=x,
+        y=y,
+        z=Z,
+        fname=str(tmp_path / "plot_heatmap_image_example.png"),
+        cmap="BrBG",
+        vmin=0,
+        vmax=200,
+        center=50,
+        levels=[10],
+        level_colors=["red"],
+        xtick_labels=[-10, 0, 10],
+        ytick_labels=[-5, 5],
+        lines=[dict(x=x[::10], y=0.5 * x[::10], c="black", width=1), dict(x=x, y=np.sin(x), c="red", width=2)],
+        backend="image",
+        subcell=True,
+    )
+
+
+def test_plot_heatmap_image_uneven(tmp_path):
+    # log spaced x cannot be an image, the cells are drawn as a mesh around each value
+    x = np.logspace(0, 3, 40)
+    y = np.linspace(-5, 5, 30)
+    z = np.log10(x)[None, :] + y[:, None]
+    p = plot_heatmap.build(
+        x, y, z, str(tmp_path / "plot_heatmap_uneven_example.png"), vmin=-5, vmax=8, backend="image"
+    )
+    p.render()
+    assert not p.ax.images
+    edges = p.mappable.get_coordinates()[0, :, 0]
+    assert np.all(edges[:-1] < x) and np.all(x < edges[1:])
+    assert np.allclose(p.mappable.get_array().reshape(z.shape), z)
+    p.close()
+
+
+def test_plot_heatmap_lines(tmp_path):
+    x = np.linspace(-10, 10, 50)
+    z = x[None, :] ** 2 + x[:, None] ** 2
+    lines = [dict(x=x[:5], y=x[:5], c="black", width=np.arange(5.0)), dict(x=x[:3], y=-x[:3], c="red", width=2)]
+    p = plot_heatmap.build(
+        x, x, z, str(tmp_path / "plot_heatmap_lines_example.png"), vmin=0, vmax=200, lines=lines, backend="image"
+    )
+    p.render()
+    assert np.array_equal(p.ax.collections[-1].get_sizes(), [0, 1, 2, 3, 4, 2, 2, 2])
+    p.close()
+
+
+def test_plot_heatmap_reduce(tmp_path):
+    x = np.linspace(-10, 10, 1000)
+    y = np.linspace(-10, 10, 800)
+    z = np.lib.format.open_memmap(str(tmp_path / "z.npy"), mode="w+", dtype=np.float64, shape=(800, 1000))
+    z[:] = x[None, :] ** 2 + y[:, None] ** 2
+    z.flush()
+
+    rx, ry, rz = decimate(x, y, z, "max", target=(100, 100))
+    assert rz.shape == (100, 100) and rx.shape == (100,) and ry.shape == (100,)
+    assert rz[0, 0] == z[:8, :10].max()
+
+    for _ in range(2):
+        plot_heatmap(
+            x=x,
+            y=y,
+            z=np.load(str(tmp_path / "z.npy"), mmap_mode="r"),
+            fname=str(tmp_path / "plot_heatmap_reduce_example.png"),
+            vmin=0,
+            vmax=200,
+            levels=[10],
+            level_colors=["red"],
+            xtick_labels=[-10, 0, 10],
+            reduce="mean",
+            reduce_shape=(100, 100),
+            pyramid_dir=str(tmp_path / "pyramid"),
+        )
+    assert len(os.listdir(str(tmp_path / "pyramid"))) == 3
+
+
+def test_plot_heatmap_pyramid(tmp_path):
+    rng = np.random.default_rng(0)
+    x = np.arange(997)
+    y = np.arange(803)
+    z = np.lib.format.open_memmap(str(tmp_path / "z.npy"), mode="w+", dtype=np.float64, shape=(803, 997))
+    z[:] = rng.random(z.shape)
+    z[rng.random(z.shape) < 0.3] = np.nan
+    z[:40, :40] = np.nan
+    z.flush()
+    z = np.load(str(tmp_path / "z.npy"), mmap_mode="r")
+    for func in ("mean", "max", "min"):
+        for target in ((100, 100), (30, 70)):
+            _, _, pz = decimate(x, y, z, func, target=target, pyramid_dir=str(tmp_path / "pyramid"))
+            # the pyramid rounds the factors up to multiples of its level, 2 ** k
+            factors = reduce_factors(z.shape, target)
+            level = 2 ** int(np.floor(np.log2(min(factors))))
+            factors = tuple(level * int(np.ceil(f / level)) for f in factors)
+            direct = block_reduce(np.asarray(z), factors, func)
+            assert level > 1 and pz.shape == direct.shape
+            np.testing.assert_allclose(pz, direct, equal_nan=True)
+
+
+def test_plot_heatmap_callable(tmp_path):
+    calls = []
+
+    def f(X, Y):
+        calls.append(X.shape)
+        return X**2 + Y**2
+
+    x = np.linspace(-10, 10, 2000)
+    y = np.linspace(-10, 10, 1500)
+    z = evaluate_grid(f, x[:50], y[:40], memory_budget=50 * 8 * 4 * 7, workers=4)
+    assert z.shape == (40, 50) and len(calls) == 6
+    assert np.allclose(z, x[None, :50] ** 2 + y[:40, None] ** 2)
+
+    calls.clear()
+    p = plot_heatmap.build(
+        x=x,
+        y=y,
+        z=f,
+        fname=str(tmp_path / "plot_heatmap_callable_example.png"),
+        vmin=0,
+        vmax=200,
+        levels=[10],
+        level_colors=["red"],
+        backend="image",
+        reduce_shape=(100, 100),
+        workers=2,
+    )
+    p.render()
+    # evaluated at the drawn resolution only
+    assert sum(s[0] * s[1] for s in calls) == 100 * 100
+    p.render(vmax=100, cmap="viridis")
+    assert sum(s[0] * s[1] for s in calls) == 100 * 100
+    p.close()
+
+
+def test_plot_heatmap_callable_cache(tmp_path):
+    from hplot import RenderCache
+
+    def make(offset):
+        def f(X, Y):
+            return X**2 + Y**2 + offset
+
+        return f
+
+    x = np.linspace(-10, 10, 200)
+    fname = str(tmp_path / "a.png")
+    cache = RenderCache(str(tmp_path / "cache"))
+    plot_heatmap(x, x, make(0.0), fname, vmin=0, vmax=200, cache=cache)
+    plot_heatmap(x, x, make(0.0), fname, vmin=0, vmax=200, cache=cache)
+    assert cache.hits == 1 and cache.misses == 1
+    # the closure holds another value, the render must not be served from the cache
+    plot_heatmap(x, x, make(1.0), fname, vmin=0, vmax=200, cache=cache)
+    assert cache.hits == 1 and cache.misses == 2
+
+    class Offset:
+        def __call__(self, X, Y):
+            return X**2 + Y**2
+
+    # its repr holds its address, the render is not cached
+    with pytest.warns(UserWarning, match="not cached"):
+        plot_heatmap(x, x, Offset(), fname, vmin=0, vmax=200, cache=cache)
+    assert cache.hits == 1 and cache.misses == 2
+
+
+def test_plot_heatmap_sparse(tmp_path):
+    import scipy.sparse as sp
+
+    z = sp.random(4000, 5000, density=0.001, format="csr", random_state=0)
+    small = z[:300, :200]
+    for func in ("mean", "max", "min"):
+        assert np.allclose(sparse_block_reduce(small, (7, 9), func), block_reduce(small.toarray(), (7, 9), func))
+
+    plot_heatmap(
+        x=np.arange(5000),
+        y=np.arange(4000),
+        z=z,
+        fname=str(tmp_path / "plot_heatmap_sparse_example.png"),
+        vmin=0,
+        vmax=0.01,
+        backend="image",
+        reduce_shape=(200, 250),
+    )
+
+
+def test_plot_heatmap_render_budget(tmp_path):
+    x = np.linspace(-10, 10, 300)
+    p = plot_heatmap.build(
+        x,
+        x,
+        x[None, :] ** 2 + x[:, None] ** 2,
+        str(tmp_path / "plot_heatmap_budget_example.svg"),
+        vmin=0,
+        vmax=200,
+        render_budget=8 << 20,
+    )
+    with pytest.warns(RuntimeWarning, match="rasterized 1 artists"):
+        p.render()
+    assert p.ax.collections[0].get_rasterized()
+    p.close()
+
+    # z is reduced to the pixels of the figure at the lowered dpi, not at hConfig.dpi
+    x = np.linspace(-10, 10, 3000)
+    p = plot_heatmap.build(
+        x,
+        x,
+        x[None, :] ** 2 + x[:, None] ** 2,
+        str(tmp_path / "plot_heatmap_budget_example.png"),
+        vmin=0,
+        vmax=200,
+        backend="image",
+        render_budget=1 << 20,
+    )
+    with pytest.warns(RuntimeWarning, match="dpi"):
+        p.render()
+    rows, cols = output_shape(fig=p.fig)
+    assert p.fig.dpi < hConfig.dpi and p._grid[2].shape[0] <= rows and p._grid[2].shape[1] <= cols
+    p.close()
+
+
 if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
     test_plot_sns()
+    test_plot_heatmap_image(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_heatmap_image_uneven(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_heatmap_lines(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_heatmap_reduce(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_heatmap_pyramid(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_heatmap_callable(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_heatmap_callable_cache(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_heatmap_sparse(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_heatmap_render_budget(pathlib.Path(tempfile.mkdtemp()))
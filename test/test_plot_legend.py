@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from hplot import RenderCache, plot_legend
+from hplot.plot_legend import clear_legend_cache
+
+
+def test_plot_legend(tmp_path):
+    clear_legend_cache()
+    # strips found in memory do not reach the on-disk cache, its hits and misses count the other calls
+    cache = RenderCache(str(tmp_path / "cache"))
+    kwargs = dict(linestyles=["-", "--", ":"], linewidths=[1, 2, 1], ncol=3, cache=cache)
+    plot_legend(["a", "b", "c"], str(tmp_path / "plot_legend_example.png"), **kwargs)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    plot_legend(["a", "b", "c"], str(tmp_path / "plot_legend_example_2.png"), **kwargs)
+    assert (cache.hits, cache.misses) == (0, 1)
+    with open(str(tmp_path / "plot_legend_example.png"), "rb") as f1:
+        with open(str(tmp_path / "plot_legend_example_2.png"), "rb") as f2:
+            assert f1.read() == f2.read()
+
+    plot_legend(["a", "b", "c"], str(tmp_path / "plot_legend_example.pdf"), **kwargs)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # served from the on-disk cache in a fresh process
+    clear_legend_cache()
+    plot_legend(["a", "b", "c"], str(tmp_path / "b.png"), **kwargs)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert len(os.listdir(cache.directory)) == 2 and os.path.isfile(str(tmp_path / "b.png"))
+
+
+def test_plot_legend_threads(tmp_path):
+    clear_legend_cache()
+
+    def job(i):
+        fname = str(tmp_path / "{}.png".format(i))
+        plot_legend(["a", "b{}".format(i % 4)], fname)
+        with open(fname, "rb") as f:
+            return i % 4, f.read()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        strips = list(executor.map(job, range(32)))
+    for i, data in strips:
+        assert data == strips[i][1]
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    test_plot_legend(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_legend_threads(pathlib.Path(tempfile.mkdtemp()))
@@ -1,7 +1,15 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
 import numpy as np
 import pytest
 
-from hplot import plot_plt
+import hplot
+from hplot import RenderCache, plot_plt
+from hplot.config import hConfig
+from hplot.downsample import downsample
 
 
 def test_plot_plt():
@@ -28,5 +36,218 @@ def test_plot_plt():
     )
 
 
+def test_plot_plt_stream(tmp_path):
+    stream = plot_plt.stream(
+        ["sin", "cos"], str(tmp_path / "plot_plt_stream_example.png"), legend=["sin", "cos"], capacity=8
+    )
+    for k in range(10):
+        x = np.linspace(k, k + 1, 50)
+        stream.append("sin", x, np.sin(x))
+        stream.append("cos", x, np.cos(x))
+    assert stream.lines[0].get_xdata().shape == (500,)
+    assert stream.ax.get_xlim()[1] >= 10
+    stream.save()
+    stream.close()
+
+
+def test_plot_plt_downsample(tmp_path):
+    x = np.linspace(0, 100, 1000000)
+    y = np.sin(x)
+    y[500000] = 10.0
+    for method in ["lttb", "minmax"]:
+        xd, yd = downsample(x, y, method, n_out=1000)
+        assert xd.shape[0] <= 1000 and yd.max() == 10.0
+        plot_plt([dict(x=x, y=y)], str(tmp_path / "plot_plt_{}_example.png".format(method)), downsample=method)
+        # the default number of points follows the dpi of the figure, lowered here by the render budget
+        p = plot_plt.build([dict(x=x, y=y)], downsample=method, render_budget=1 << 22)
+        p.render(str(tmp_path / "plot_plt_{}_budget.png".format(method)))
+        assert p.fig.dpi < hConfig.dpi
+        width = p.fig.get_size_inches()[0] * p.fig.dpi
+        assert p.lines[0].get_xdata().shape[0] <= 2 * np.ceil(width)
+        p.close()
+
+
+def test_plot_plt_build(tmp_path):
+    x = np.linspace(-2, 2, 200)
+    p = plot_plt.build([dict(x=x, y=np.sin(x))], xlabel="x", legend=["sin"])
+    assert p.fig is None
+    p.render(str(tmp_path / "plot_plt_build_a.png"))
+    fig, line = p.fig, p.lines[0]
+    p.render(str(tmp_path / "plot_plt_build_b.png"), xlim=[-1, 1], ylabel="y")
+    assert p.fig is fig and p.lines[0] is line
+    p.render(str(tmp_path / "plot_plt_build_c.png"), data=[dict(x=x, y=np.cos(x))])
+    assert p.fig is fig and p.lines[0] is not line
+    p.close()
+
+
+def test_plot_plt_threads(tmp_path):
+    x = np.linspace(-2, 2, 2000)
+
+    def job(k):
+        plot_plt([dict(x=x, y=np.sin(k * x))], str(tmp_path / "plot_plt_thread_{}.png".format(k)))
+
+    figures = plt.get_fignums()
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(job, range(8)))
+    assert plt.get_fignums() == figures
+
+
+def test_plot_plt_formats(tmp_path):
+    x = np.linspace(-2, 2, 200)
+    data = [dict(x=x, y=np.sin(x))]
+    plot_plt(data, str(tmp_path / "plot_plt_formats.png"), formats=["png", "pdf", "svg"], parallel_save=True)
+    plot_plt(data, [str(tmp_path / "plot_plt_formats_list.png"), str(tmp_path / "plot_plt_formats_list.pdf")])
+    for f in ["formats.png", "formats.pdf", "formats.svg", "formats_list.png", "formats_list.pdf"]:
+        assert os.path.getsize(str(tmp_path / ("plot_plt_" + f))) > 0
+
+
+def test_plot_plt_cache(tmp_path):
+    x = np.linspace(-2, 2, 200)
+    cache = RenderCache(str(tmp_path / "cache"))
+    for _ in range(2):
+        plot_plt([dict(x=x, y=np.sin(x))], str(tmp_path / "plot_plt_cache.png"), formats=["png", "pdf"], cache=cache)
+    plot_plt([dict(x=x, y=np.cos(x))], str(tmp_path / "plot_plt_cache.png"), cache=cache)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 3)
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.stats()["entries"] == 0
+
+
+def test_plot_plt_profile(tmp_path):
+    from hplot import ProfileSummary
+
+    x = np.linspace(-2, 2, 1000)
+    summary = ProfileSummary()
+    for _ in range(2):
+        plot_plt(
+            [dict(x=x, y=np.sin(x)), dict(x=x, y=np.cos(x))],
+            str(tmp_path / "plot_plt_profile_example.png"),
+            legend=["sin", "cos"],
+            profile=summary,
+            cache=str(tmp_path / "cache"),
+        )
+    first, second = summary.profiles
+    assert set(first.stages) == {"preprocess", "draw", "decorate", "layout", "save", "cache"}
+    assert first.vertices >= 2000 and first.artists > 0 and first.bytes > 0 and not first.cached
+    assert second.cached and "draw" not in second.stages
+    assert summary.summary()["plot_plt"]["renders"] == 2
+    assert "plot_plt" in summary.table()
+
+    # build() and render() report every render with the stages of that render only
+    summary = ProfileSummary()
+    p = plot_plt.build([dict(x=x, y=np.sin(x))], profile=summary)
+    p.render(str(tmp_path / "plot_plt_profile_a.png"))
+    p.render(str(tmp_path / "plot_plt_profile_b.png"), xlim=[-1, 1])
+    p.close()
+    first, second = summary.profiles
+    assert {"preprocess", "draw", "decorate", "save"} <= set(first.stages)
+    assert "draw" not in second.stages and "preprocess" not in second.stages and "decorate" in second.stages
+
+
+def test_plot_plt_render_budget(tmp_path):
+    x = np.linspace(0, 10, 1000000)
+    p = plot_plt.build([dict(x=x, y=np.sin(x))], str(tmp_path / "plot_plt_budget_example.png"), render_budget=16 << 20)
+    with pytest.warns(RuntimeWarning, match="downsampled"):
+        p.render()
+    assert p.fig.dpi < 600 and len(p.budget_actions) == 2
+    width = p.fig.get_size_inches()[0] * p.fig.dpi
+    assert p.lines[0].get_xdata().shape[0] <= 2 * np.ceil(width)
+    # the downsampling applies to this render, a render of new data starts from the full series
+    x = np.linspace(0, 10, 1000)
+    p.render(data=[dict(x=x, y=np.cos(x))])
+    assert p.lines[0].get_xdata().shape[0] == 1000
+    p.close()
+
+
+def test_plot_plt_tick_font(tmp_path):
+    x = np.linspace(-2, 2, 200)
+    with hplot.use_config(tick_label_font="DejaVu Serif"):
+        p = plot_plt.build([dict(x=x, y=np.sin(x))], str(tmp_path / "plot_plt_tick_font.png"))
+    p.render()
+    # ticks added by a later render use the tick font as well
+    p.render(xlim=[-20, 20])
+    labels = p.ax.get_xticklabels() + p.ax.get_yticklabels()
+    assert {label.get_fontname() for label in labels} == {"DejaVu Serif"}
+    p.close()
+
+    # keys besides family, size and weight reach the label font
+    label_font = dict(hConfig.label_font, style="italic", stretch="condensed")
+    with hplot.use_config(label_font=label_font):
+        p = plot_plt.build([dict(x=x, y=np.sin(x))], str(tmp_path / "plot_plt_label_font.png"), xlabel="x")
+    p.render()
+    assert p.ax.xaxis.label.get_style() == "italic" and p.ax.xaxis.label.get_stretch() == "condensed"
+    p.close()
+
+
+def test_plot_plt_usetex_fallback(tmp_path):
+    from matplotlib.texmanager import TexManager
+    from matplotlib.text import Text
+
+    from hplot.tex import needs_tex
+
+    assert not needs_tex("time [s]") and not needs_tex(r"$\alpha_1$") and not needs_tex(r"$\mathdefault{10^{3}}$")
+    assert needs_tex(r"\textbf{a}") and needs_tex(r"$\begin{array}{c}a\end{array}$")
+
+    x = np.linspace(-2, 2, 200)
+    texcache = TexManager.texcache
+    with matplotlib.rc_context(), hplot.use_config(usetex=True, tex_cache=str(tmp_path / "tex")):
+        # nothing needs latex, the figure renders without a tex installation
+        p = plot_plt.build(
+            [dict(x=x, y=np.sin(x))], str(tmp_path / "plot_plt_usetex.png"), xlabel="x [m]", ylabel=r"$\sin x$"
+        )
+        p.render()
+        assert not any(t.get_usetex() for t in p.fig.findobj(Text))
+        # the cache directory is set while rendering only
+        assert TexManager.texcache == texcache
+        p.close()
+    assert not matplotlib.rcParams["text.usetex"]
+
+
+def test_plot_plt_config_threads(tmp_path):
+    x = np.linspace(-2, 2, 200)
+
+    def job(k):
+        dpi = 100 if k % 2 else 150
+        with hplot.use_config(dpi=dpi, usetex=bool(k % 2)):
+            p = plot_plt.build(
+                [dict(x=x, y=np.sin(k * x))], str(tmp_path / "plot_plt_config_{}.png".format(k)), xlabel="x"
+            )
+        # rendered outside of the with block, the plotter keeps its snapshot
+        p.render()
+        assert p.fig.dpi == dpi and p.ax.xaxis.label.get_usetex() is False
+        p.close()
+        return dpi, plt.imread(str(tmp_path / "plot_plt_config_{}.png".format(k))).shape[1]
+
+    with ThreadPoolExecutor(4) as executor:
+        widths = dict(executor.map(job, range(8)))
+    assert widths[100] < widths[150]
+    assert hConfig.dpi == 600 and not hConfig.usetex and not matplotlib.rcParams["text.usetex"]
+
+    with hplot.use_config(dpi=100) as a:
+        with pytest.raises(AttributeError):
+            hConfig.dpi = 200
+        with pytest.raises(KeyError):
+            a.replace(dpl=200)
+    assert a == a.replace(dpi=100) and hConfig.dpi == 600
+    assert hash(a) == hash(a.replace(label_font=dict(hConfig.label_font))) and a != a.replace(dpi=200)
+    with pytest.raises(AttributeError):
+        a.dpi = 200
+
+
 if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
     test_plot_plt()
+    test_plot_plt_stream(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_downsample(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_build(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_threads(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_formats(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_cache(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_profile(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_render_budget(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_tick_font(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_usetex_fallback(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_plt_config_threads(pathlib.Path(tempfile.mkdtemp()))
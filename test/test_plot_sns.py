@@ -34,5 +34,104 @@ def test_plot_sns():
     )
 
 
+def test_plot_sns_errorbar(tmp_path):
+    x = np.linspace(-2, 2, 500)
+    ys = [0.7 * np.sin(2 * 3.14 * x) + 0.3 * np.random.randn(*x.shape) for _ in range(5)]
+    data = [dict(x=[x] * 5, y=ys, label="sin")]
+    plot_sns(
+        data,
+        str(tmp_path / "plot_sns_errorbar_example.png"),
+        xlabel="x",
+        ylabel="y",
+        errorbar=("pi", 90),
+        estimator="median",
+        downsample="lttb",
+        downsample_points=100,
+        display=False,
+    )
+
+
+def test_aggregate_runs():
+    import warnings
+    from statistics import NormalDist
+
+    from hplot.aggregate import aggregate_runs
+
+    y = np.array(
+        [
+            [1.0, 2.0, np.nan],
+            [2.0, 4.0, 5.0],
+            [4.0, 9.0, np.nan],
+        ]
+    )
+    mean = np.array([7.0 / 3.0, 5.0, 5.0])
+    std = np.array([np.std([1.0, 2.0, 4.0], ddof=1), np.std([2.0, 4.0, 9.0], ddof=1), np.nan])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        c, lo, hi = aggregate_runs(y, errorbar=("sd", 2))
+        np.testing.assert_allclose(c, mean)
+        np.testing.assert_allclose(hi - c, 2 * std)
+        np.testing.assert_allclose(c - lo, 2 * std)
+        # a single value has no spread, no band is drawn there
+        assert np.isnan(lo[2]) and np.isnan(hi[2])
+
+        c, lo, hi = aggregate_runs(y, errorbar=("ci", 95))
+        z = NormalDist().inv_cdf(0.975)
+        np.testing.assert_allclose(hi[:2] - c[:2], z * std[:2] / np.sqrt(3))
+
+        c, lo, hi = aggregate_runs(y, estimator="median", errorbar=("pi", 50))
+        np.testing.assert_allclose(c, [2.0, 4.0, 5.0])
+        np.testing.assert_allclose(lo, [1.5, 3.0, 5.0])
+        np.testing.assert_allclose(hi, [3.0, 6.5, 5.0])
+
+
+def test_plot_sns_render_budget(tmp_path):
+    from hplot.profile import artist_vertices
+
+    x = np.linspace(0, 10, 200000)
+    ys = [np.sin(x) + 0.1 * np.random.randn(*x.shape) for _ in range(3)]
+    p = plot_sns.build(
+        [dict(x=[x] * 3, y=ys, label="sin")],
+        str(tmp_path / "plot_sns_budget_example.png"),
+        errorbar="sd",
+        render_budget=16 << 20,
+    )
+    with pytest.warns(RuntimeWarning, match="downsampled"):
+        p.render()
+    # the cached curve is downsampled as well, not only the report
+    width = p.fig.get_size_inches()[0] * p.fig.dpi
+    line = p.ax.get_lines()[0]
+    assert artist_vertices(line) <= 2 * np.ceil(width)
+    assert sum(artist_vertices(a) for a in p.ax.get_children()) * 32 <= 16 << 20
+    p.close()
+
+
+def test_plot_sns_memmap(tmp_path):
+    x = np.linspace(-2, 2, 5000)
+    y = np.lib.format.open_memmap(str(tmp_path / "y.npy"), mode="w+", dtype=np.float32, shape=(8, x.shape[0]))
+    y[:] = np.sin(2 * 3.14 * x) + 0.3 * np.random.randn(*y.shape)
+    y.flush()
+    np.save(str(tmp_path / "x.npy"), x)
+    data = [dict(x=str(tmp_path / "x.npy"), y=str(tmp_path / "y.npy"), label="sin")]
+    plot_sns(data, str(tmp_path / "plot_sns_memmap_example.png"), errorbar="se", memory_budget=1 << 16, display=False)
+
+    # a budget of 1 << 16 bytes splits the 5000 points of the 8 runs into 20 blocks
+    from hplot.aggregate import aggregate_runs, aggregate_runs_chunked
+
+    y[0, ::7] = np.nan
+    for estimator, errorbar in (("mean", "sd"), ("mean", ("ci", 90)), ("median", ("pi", 50))):
+        chunked = aggregate_runs_chunked(y, estimator=estimator, errorbar=errorbar, memory_budget=1 << 16)
+        whole = aggregate_runs(np.asarray(y), estimator=estimator, errorbar=errorbar)
+        for a, b in zip(chunked, whole):
+            np.testing.assert_allclose(a, b, rtol=1e-5, atol=1e-6)
+
+
 if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
     test_plot_sns()
+    test_plot_sns_errorbar(pathlib.Path(tempfile.mkdtemp()))
+    test_aggregate_runs()
+    test_plot_sns_render_budget(pathlib.Path(tempfile.mkdtemp()))
+    test_plot_sns_memmap(pathlib.Path(tempfile.mkdtemp()))
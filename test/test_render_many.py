@@ -0,0 +1,53 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from hplot import render_many
+from hplot.batch import _SharedBlocks
+
+
+def test_render_many(tmp_path):
+    x = np.linspace(-2, 2, 200000)
+    jobs = [
+        dict(
+            plotter="plot_plt",
+            args=([dict(x=x, y=np.sin(k * x))], str(tmp_path / "render_many_{}.png".format(k))),
+        )
+        for k in range(3)
+    ]
+    jobs.append(dict(plotter="plot_plt", args=([dict(x=x)], str(tmp_path / "render_many_bad.png"))))
+    # a job that cannot be parsed fails alone
+    jobs.append(dict(args=([dict(x=x, y=x)], str(tmp_path / "render_many_no_plotter.png"))))
+
+    results = render_many(jobs, workers=2, progress=False)
+    assert [r.ok for r in results] == [True, True, True, False, False]
+    assert "KeyError" in results[3].error and "'plotter'" in results[4].error
+
+
+def test_render_many_shared_blocks():
+    x = np.linspace(-2, 2, 200000)
+    blocks = _SharedBlocks(1 << 10)
+    used_a, used_b = [], []
+    a = blocks.share((dict(x=x, y=np.sin(x)),), used_a)
+    b = blocks.share((dict(x=x, y=np.cos(x)),), used_b)
+    # x is copied once for both jobs
+    assert a[0]["x"] == b[0]["x"] and a[0]["y"] != b[0]["y"]
+    assert len({h.name for h in (a[0]["x"], a[0]["y"], b[0]["y"])}) == 3
+    blocks.release(used_a)
+    # the block of x is kept for the second job, the block of the first y is gone
+    shared_memory.SharedMemory(name=b[0]["x"].name).close()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=a[0]["y"].name)
+    blocks.release(used_b)
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=b[0]["x"].name)
+    blocks.close()
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    test_render_many(pathlib.Path(tempfile.mkdtemp()))
+    test_render_many_shared_blocks()